@@ -0,0 +1,195 @@
+""" Asyncio front end for deciding kiosk submissions at Kanadia's border """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import asyncio
+import collections
+import logging
+from datetime import date
+from border_office import BorderOffice
+from papers import decide_entry
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBorderOffice(object):
+    """
+    decides travellers submitted concurrently from an event loop
+    records submitted in the same pass of the event loop are coalesced and
+        decided together against one snapshot of the reference data, in
+        batches of at most max_batch so other tasks are not starved; the
+        rules only work on data in memory, so deciding never waits on I/O
+    the reference files are only checked and reloaded in a worker thread,
+        every reload_interval seconds and by reload, so the loop never
+        blocks on file I/O; a failed background reload is logged and
+        counted in reload_errors, and deciding goes on with the loaded data
+    """
+
+    def __init__(self, office, reload_interval=1.0, max_batch=256):
+        """
+        :param office: BorderOffice holding the loaded reference data
+        :param reload_interval: seconds between checks of the reference
+            files for changes, or None to only reload when asked
+        :param max_batch: most records decided in one pass of the loop
+        """
+
+        self.office = office
+        self.reload_interval = reload_interval
+        self.max_batch = max_batch
+        self.batches = 0
+        self.reload_errors = 0
+        self._pending = collections.deque()
+        self._flush_scheduled = False
+        self._watcher = None
+
+    @classmethod
+    async def create(cls, watchlist_file, countries_file, stats=None,
+                     cache=None, **options):
+        """
+        loads the reference files in a worker thread and starts watching
+            them for changes
+        :param watchlist_file: path of a JSON formatted watchlist file
+        :param countries_file: path of a JSON formatted countries file
+        :param stats: papers.DecisionStats that every decision is counted in
+        :param cache: decision_cache.DecisionCache to decide through, or None
+        :param options: reload_interval and max_batch, as for the constructor
+        :return: AsyncBorderOffice
+        """
+
+        office = await asyncio.to_thread(BorderOffice, watchlist_file,
+                                         countries_file, stats, cache)
+        async_office = cls(office, **options)
+        async_office.start()
+        return async_office
+
+    def start(self):
+        """
+        starts checking the reference files every reload_interval seconds
+        """
+
+        if self.reload_interval is not None and self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(
+                self._watch())
+
+    async def close(self):
+        """
+        stops checking the reference files
+        """
+
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def reload(self):
+        """
+        reloads the reference files in a worker thread if either changed;
+            decisions go on against the old data until the new data is in
+        :return: Boolean; True if the data was reloaded, False otherwise
+        """
+
+        return await asyncio.to_thread(self.office.reload_if_changed)
+
+    async def decide_record(self, entry_record, reference_date=None):
+        """
+        decides whether one traveller's entry into Kanadia should be accepted
+        :param entry_record: the traveller's entry record information
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: string; "Quarantine", "Reject", "Secondary", or "Accept"
+        """
+
+        return await self.submit(entry_record, reference_date)
+
+    def submit(self, entry_record, reference_date=None):
+        """
+        queues one traveller for the next coalesced batch
+        :param entry_record: the traveller's entry record information
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: asyncio.Future of the decision string
+        """
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((entry_record, reference_date, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return future
+
+    async def decide_stream(self, entries, reference_date=None):
+        """
+        decides travellers from an asynchronous stream, keeping up to
+            max_batch of them queued so they are coalesced into batches
+        :param entries: async iterable of entry records
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: async iterator of decision strings, in the order of entries
+        """
+
+        queued = collections.deque()
+        async for entry_record in entries:
+            queued.append(self.submit(entry_record, reference_date))
+            if len(queued) >= self.max_batch:
+                yield await queued.popleft()
+        while queued:
+            yield await queued.popleft()
+
+    def _flush(self):
+        #decide up to max_batch queued records against one snapshot, and
+        #leave the rest for the next pass so other tasks get to run
+        watch_list, countries = self.office.reference_data()
+        stats = self.office.stats
+        cache = self.office.cache
+        today = date.today()
+        self.batches += 1
+        for _ in range(min(self.max_batch, len(self._pending))):
+            entry_record, reference_date, future = self._pending.popleft()
+            if future.cancelled():
+                continue
+            try:
+                if cache is None:
+                    decision = decide_entry(entry_record, watch_list,
+                                            countries,
+                                            reference_date or today, stats)
+                else:
+                    decision = cache.decide(entry_record, watch_list,
+                                            countries, reference_date or today)
+                future.set_result(decision)
+            except Exception as error:
+                future.set_exception(error)
+        if self._pending:
+            asyncio.get_running_loop().call_soon(self._flush)
+        else:
+            self._flush_scheduled = False
+
+    async def _watch(self):
+        #a reference file that is missing or half written while it is being
+        #replaced must not stop the watching; the loaded data is kept and
+        #the files are checked again after the next interval
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception:
+                self.reload_errors += 1
+                logger.exception("reloading the reference data failed; "
+                                 "still deciding with the loaded data")
@@ -0,0 +1,251 @@
+""" Sharded, resumable batch driver for deciding many ports' entry files """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+from datetime import date
+from entry_store import as_json
+from papers import decide_iter
+from papers import open_entries
+from traffic import write_entries
+
+#name of the manifest file in a batch's work folder
+MANIFEST_NAME = "manifest.json"
+
+#shard states recorded in the manifest
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+def run_batch(entries_files, watchlist_file, countries_file, work_dir,
+              nodes=2, shard_size=100000, reference_date=None):
+    """
+    decides entry files as independent shards, resuming an earlier run
+    the entries are split into shard files in work_dir and a manifest
+        records each shard's state; shards are then decided by nodes local
+        processes, and the manifest is updated as each one finishes
+    if work_dir already holds a manifest for the same files, the entries
+        are not split again and only shards that are not done are decided,
+        with the reference date of the first run
+    another host sharing work_dir can decide a shard with run_shard, or
+        "python batch_driver.py shard work_dir name"
+    :param entries_files: list of paths of entry files, in any format
+        papers.open_entries reads, in the order their decisions are merged
+        in
+    :param watchlist_file: path of a JSON formatted watchlist file
+    :param countries_file: path of a JSON formatted countries file
+    :param work_dir: folder for the shards, their decisions and the manifest
+    :param nodes: number of worker processes deciding shards
+    :param shard_size: number of entries in each shard
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today on the first run
+    :return: the manifest dictionary
+    :raises ValueError: if work_dir holds a manifest for other files
+    """
+
+    inputs = {"entries_files": [os.path.abspath(name)
+                                for name in entries_files],
+              "watchlist_file": os.path.abspath(watchlist_file),
+              "countries_file": os.path.abspath(countries_file)}
+    manifest = read_manifest(work_dir)
+    if manifest is None:
+        if reference_date is None:
+            reference_date = date.today()
+        manifest = dict(inputs, reference_date=reference_date.isoformat(),
+                        shards=partition(entries_files, work_dir, shard_size))
+        _write_manifest(work_dir, manifest)
+    elif any(manifest[key] != value for key, value in inputs.items()):
+        raise ValueError("{0} holds a batch of other files".format(work_dir))
+
+    #a shard whose decisions were written but not yet recorded is done too
+    waiting = []
+    for shard in manifest["shards"]:
+        if os.path.exists(_decisions_path(work_dir, shard["name"])):
+            shard["status"] = DONE
+        else:
+            shard["status"] = PENDING
+            waiting.append(shard["name"])
+    _write_manifest(work_dir, manifest)
+
+    if not waiting:
+        return manifest
+    shards = dict((shard["name"], shard) for shard in manifest["shards"])
+    with multiprocessing.Pool(min(nodes, len(waiting))) as pool:
+        for name, error in pool.imap_unordered(
+                _run_shard_safely, [(work_dir, name) for name in waiting]):
+            shards[name].pop("error", None)
+            if error is None:
+                shards[name]["status"] = DONE
+            else:
+                shards[name]["status"] = FAILED
+                shards[name]["error"] = error
+            _write_manifest(work_dir, manifest)
+    return manifest
+
+
+def partition(entries_files, work_dir, shard_size=100000):
+    """
+    splits entry files into shard files of at most shard_size entries,
+        reading the entries one at a time
+    shards are JSON arrays, whatever the format of the entry files
+    :param entries_files: list of paths of entry files, in any format
+        papers.open_entries reads
+    :param work_dir: folder to write the shards in
+    :param shard_size: number of entries in each shard
+    :return: list of shard dictionaries with "name", "count" and "status"
+    """
+
+    os.makedirs(work_dir, exist_ok=True)
+    shards = []
+    chunk = []
+    for entries_file in entries_files:
+        with open_entries(os.path.abspath(entries_file)) as entries:
+            for entry in entries:
+                chunk.append(as_json(entry))
+                if len(chunk) == shard_size:
+                    shards.append(_write_shard(work_dir, len(shards), chunk))
+                    chunk = []
+    if chunk:
+        shards.append(_write_shard(work_dir, len(shards), chunk))
+    return shards
+
+
+def run_shard(work_dir, name):
+    """
+    decides one shard with papers.decide, against the reference files and
+        date in the manifest, and writes its decisions next to it
+    the decisions file is written under a temporary name and renamed, so it
+        only exists once it is complete
+    :param work_dir: folder of the batch
+    :param name: name of the shard, as in the manifest
+    :return: int number of decisions written
+    """
+
+    manifest = read_manifest(work_dir)
+    reference_date = datetime.datetime.strptime(
+        manifest["reference_date"], "%Y-%m-%d").date()
+    decisions = list(decide_iter(os.path.join(os.path.abspath(work_dir),
+                                              name),
+                                 manifest["watchlist_file"],
+                                 manifest["countries_file"],
+                                 reference_date=reference_date))
+    decisions_path = _decisions_path(work_dir, name)
+    temporary_path = "{0}.{1}.tmp".format(decisions_path, os.getpid())
+    with open(temporary_path, "w") as json_file:
+        json.dump(decisions, json_file)
+    os.replace(temporary_path, decisions_path)
+    return len(decisions)
+
+
+def iter_results(work_dir):
+    """
+    merges the decisions of every shard in the original order of entries
+    :param work_dir: folder of a finished batch
+    :return: iterator of decision strings
+    :raises ValueError: if a shard has not been decided
+    """
+
+    manifest = read_manifest(work_dir)
+    for shard in manifest["shards"]:
+        decisions_path = _decisions_path(work_dir, shard["name"])
+        if not os.path.exists(decisions_path):
+            raise ValueError("shard {0} has not been decided; run the batch "
+                             "again to resume it".format(shard["name"]))
+        with open(decisions_path) as json_file:
+            for decision in json.load(json_file):
+                yield decision
+
+
+def decide_sharded(entries_files, watchlist_file, countries_file, work_dir,
+                   nodes=2, shard_size=100000, reference_date=None):
+    """
+    runs or resumes a batch and returns its merged decisions; see run_batch
+    :return: list of decision strings, one per entry, in order
+    """
+
+    run_batch(entries_files, watchlist_file, countries_file, work_dir, nodes,
+              shard_size, reference_date)
+    return list(iter_results(work_dir))
+
+
+def read_manifest(work_dir):
+    """
+    :param work_dir: folder of a batch
+    :return: the manifest dictionary, or None if there is none yet
+    """
+
+    try:
+        with open(os.path.join(work_dir, MANIFEST_NAME)) as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(work_dir, manifest):
+    #replace the manifest in one step, so a crash never leaves half of it
+    manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w") as json_file:
+        json.dump(manifest, json_file, indent=1)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def _write_shard(work_dir, number, entries):
+    name = "shard_{0:05d}.json".format(number)
+    write_entries(os.path.join(work_dir, name), entries)
+    return {"name": name, "count": len(entries), "status": PENDING}
+
+
+def _decisions_path(work_dir, name):
+    return os.path.join(work_dir, name[:-len(".json")] + ".decisions.json")
+
+
+def _run_shard_safely(arguments):
+    #a failed shard is recorded in the manifest instead of ending the batch
+    work_dir, name = arguments
+    try:
+        run_shard(work_dir, name)
+    except Exception as error:
+        return name, "{0}: {1}".format(type(error).__name__, error)
+    return name, None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    batch = commands.add_parser("batch", help="split, decide and merge")
+    batch.add_argument("work_dir")
+    batch.add_argument("watchlist_file")
+    batch.add_argument("countries_file")
+    batch.add_argument("entries_files", nargs="+")
+    batch.add_argument("--nodes", type=int, default=2)
+    batch.add_argument("--shard-size", type=int, default=100000)
+    shard = commands.add_parser("shard", help="decide one shard of a batch")
+    shard.add_argument("work_dir")
+    shard.add_argument("name")
+    arguments = parser.parse_args()
+
+    if arguments.command == "shard":
+        run_shard(arguments.work_dir, arguments.name)
+        sys.exit(0)
+
+    result = run_batch(arguments.entries_files, arguments.watchlist_file,
+                       arguments.countries_file, arguments.work_dir,
+                       arguments.nodes, arguments.shard_size)
+    failed = [shard["name"] for shard in result["shards"]
+              if shard["status"] != DONE]
+    if failed:
+        sys.exit("shards not decided: {0}".format(", ".join(failed)))
+    json.dump(list(iter_results(arguments.work_dir)), sys.stdout)
@@ -0,0 +1,949 @@
+""" Benchmarks for papers.py """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import argparse
+import json
+import os
+import platform
+import random
+import string
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from array import array
+from datetime import date
+from datetime import datetime
+from papers import CountryTable
+from papers import decide_entries
+from papers import decide_entry
+from papers import is_quarantine
+from papers import is_reject
+from papers import is_secondary
+from papers import is_valid_entry_record
+from papers import is_valid_visa
+from papers import iter_json_array
+from papers import parse_date
+from papers import valid_date_format
+from papers import WatchlistIndex
+from traffic import FIRST_NAMES
+from traffic import generate_entries
+from traffic import LAST_NAMES
+from traffic import random_passport
+from traffic import write_entries
+
+#folder holding countries.json and watchlist.json
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def random_watchlist(size, rng):
+    """
+    makes a watchlist shaped like watchlist.json, where each suspect is
+        listed either by name or by passport number
+    :param size: number of suspects
+    :param rng: random.Random instance
+    :return: list of watchlist entries
+    """
+
+    watch_list = []
+    for _ in range(size):
+        if rng.random() < 0.5:
+            watch_list += [{"first_name": "", "last_name": "",
+                            "passport": random_passport(rng)}]
+        else:
+            watch_list += [{"first_name": "".join(rng.choice(
+                string.ascii_uppercase) for _ in range(7)),
+                "last_name": "".join(rng.choice(
+                    string.ascii_uppercase) for _ in range(9)),
+                "passport": ""}]
+    return watch_list
+
+
+def load_reference_data():
+    """
+    loads the real countries and watchlist files
+    :return: tuple of (countries dictionary, watchlist list)
+    """
+
+    with open(os.path.join(DATA_DIR, "countries.json")) as countries_file, \
+            open(os.path.join(DATA_DIR, "watchlist.json")) as watchlist_file:
+        return json.load(countries_file), json.load(watchlist_file)
+
+
+def linear_scan(entry_record, watch_list):
+    """
+    the original watchlist scan, kept for comparison
+    """
+
+    for suspect in watch_list:
+        if entry_record["first_name"].upper() \
+                == suspect["first_name"].upper() \
+                and entry_record["last_name"].upper() \
+                == suspect["last_name"].upper():
+            return True
+        elif entry_record["passport"] == suspect["passport"]:
+            return True
+    return False
+
+
+def legacy_is_quarantine(entry_record, countries_dict):
+    """
+    the original quarantine check on the raw countries dictionary, kept for
+        comparison
+    """
+
+    if "from" in entry_record.keys():
+        if "country" in entry_record["from"].keys():
+            from_country = entry_record["from"]["country"].upper()
+            if entry_record["from"]["country"].upper() \
+                    in countries_dict.keys():
+                if countries_dict[from_country]["medical_advisory"] != "":
+                    return True
+    if "via" in entry_record.keys():
+        if "country" in entry_record["via"].keys():
+            via_country = entry_record["via"]["country"].upper()
+            if entry_record["via"]["country"].upper() in countries_dict.keys():
+                if countries_dict[via_country]["medical_advisory"] != "":
+                    return True
+    else:
+        return False
+
+
+def legacy_is_reject(entry_record, country_dict):
+    """
+    the original reject check on the raw countries dictionary, kept for
+        comparison
+    """
+
+    if not is_valid_entry_record(entry_record):
+        return True
+    from_country = entry_record["from"]["country"].upper()
+    if not from_country in country_dict.keys() and from_country != "KAN":
+        return True
+    elif entry_record["entry_reason"].upper() == "TRANSIT" \
+            and country_dict[from_country]["transit_visa_required"] == "1":
+        if not is_valid_visa(entry_record):
+            return True
+    elif entry_record["entry_reason"].upper() == "VISIT" \
+            and country_dict[from_country]["visitor_visa_required"] == "1":
+        if not is_valid_visa(entry_record):
+            return True
+    else:
+        return False
+
+
+def bench_watchlist(sizes=(100, 1000, 10000, 100000), lookups=1000, seed=1340):
+    """
+    times watchlist lookups for the linear scan and for WatchlistIndex
+    :param sizes: watchlist lengths to try
+    :param lookups: number of travellers looked up per size
+    :param seed: seed for the random watchlist and travellers
+    :return: list of (size, scan seconds per lookup, index seconds per lookup)
+    """
+
+    rng = random.Random(seed)
+    travellers = [{"first_name": "JOHN", "last_name": "SMITH",
+                   "passport": random_passport(rng)} for _ in range(lookups)]
+    results = []
+    for size in sizes:
+        watch_list = random_watchlist(size, rng)
+        index = WatchlistIndex(watch_list)
+        scan_runs = max(1, min(lookups, 10 ** 6 // size))
+        scan_time = timeit.timeit(
+            lambda: [linear_scan(traveller, watch_list)
+                     for traveller in travellers[:scan_runs]],
+            number=1) / scan_runs
+        index_time = timeit.timeit(
+            lambda: [index.matches(traveller) for traveller in travellers],
+            number=1) / lookups
+        results += [(size, scan_time, index_time)]
+    return results
+
+
+def bench_workers(worker_counts=(1, 2, 4, 8), count=200000, seed=1340):
+    """
+    times decide_entries over the same entries with different process counts
+    :param worker_counts: numbers of worker processes to try
+    :param count: number of entry records
+    :param seed: seed for the random entries
+    :return: list of (workers, seconds, records per second)
+    """
+
+    countries, watch_list = load_reference_data()
+    entries = list(generate_entries(count, countries, seed=seed))
+    index = WatchlistIndex(watch_list)
+    expected = None
+    results = []
+    for workers in worker_counts:
+        start = time.perf_counter()
+        decisions = list(decide_entries(entries, index, countries, workers))
+        seconds = time.perf_counter() - start
+        if expected is None:
+            expected = decisions
+        assert decisions == expected, "parallel decisions out of order"
+        results += [(workers, seconds, count / seconds)]
+    return results
+
+
+def bench_country_rules(count=20000, seed=1340):
+    """
+    times the quarantine and reject checks on the raw countries dictionary
+        and on a compiled CountryTable
+    :param count: number of entry records
+    :param seed: seed for the random entries
+    :return: list of (check, dictionary seconds per record,
+        table seconds per record)
+    """
+
+    countries, _ = load_reference_data()
+    entries = list(generate_entries(count, countries, seed=seed))
+    table = CountryTable(countries)
+    results = []
+    for check, legacy, compiled in [
+            ("is_quarantine", legacy_is_quarantine, is_quarantine),
+            ("is_reject", legacy_is_reject, is_reject)]:
+        dict_time = timeit.timeit(
+            lambda: [legacy(entry, countries) for entry in entries],
+            number=1) / count
+        table_time = timeit.timeit(
+            lambda: [compiled(entry, table) for entry in entries],
+            number=1) / count
+        results += [(check, dict_time, table_time)]
+    return results
+
+
+def legacy_valid_date_format(date_string):
+    """
+    the original date check, reading the clock on every call, kept for
+        comparison
+    """
+
+    try:
+        time = datetime.strptime(date_string, '%Y-%m-%d')
+        if date(time.year, time.month, time.day) > date.today():
+            return False
+        if time.year < (date.today().year - 150):
+            return False
+        return True
+    except ValueError:
+        return False
+
+
+def bench_dates(count=20000, seed=1340):
+    """
+    times the birth and visa date checks with strptime and the clock read
+        per call, and with the cached parser and one reference date
+    :param count: number of entry records
+    :param seed: seed for the random entries
+    :return: tuple of (strptime seconds per record, cached seconds per record)
+    """
+
+    countries, _ = load_reference_data()
+    entries = list(generate_entries(count, countries, seed=seed))
+    dates = [entry["birth_date"] for entry in entries
+             if "birth_date" in entry] \
+        + [entry["visa"]["date"] for entry in entries if "visa" in entry]
+    legacy_time = timeit.timeit(
+        lambda: [legacy_valid_date_format(date_string)
+                 for date_string in dates], number=1) / count
+    parse_date.cache_clear()
+    reference_date = date.today()
+    cached_time = timeit.timeit(
+        lambda: [valid_date_format(date_string, reference_date)
+                 for date_string in dates], number=1) / count
+    return legacy_time, cached_time
+
+
+def bench_columnar(rows=10 ** 7, sample=100000, seed=1340):
+    """
+    times the columnar engine against the row-by-row path
+    a sample of entries is decided both ways and must agree; its columns
+        are then repeated up to rows entries to time the vectorized step
+    :param rows: number of entries the vectorized step is timed on
+    :param sample: number of random entries loaded and checked
+    :param seed: seed for the random entries
+    :return: tuple of (row seconds per record, column loading seconds per
+        record, vectorized seconds per record)
+    """
+
+    import numpy
+    from columnar import COLUMNS
+    from columnar import decide_columns
+    from columnar import DECISIONS
+    from columnar import EntryColumns
+    from columnar import load_columns
+
+    countries, watch_list = load_reference_data()
+    entries = list(generate_entries(sample, countries, seed=seed))
+    index = WatchlistIndex(watch_list)
+    table = CountryTable(countries)
+    reference_date = date.today()
+
+    start = time.perf_counter()
+    row_decisions = list(decide_entries(entries, index, table,
+                                        reference_date=reference_date))
+    row_time = (time.perf_counter() - start) / sample
+
+    start = time.perf_counter()
+    columns = load_columns(entries)
+    load_time = (time.perf_counter() - start) / sample
+    assert [DECISIONS[decision] for decision in decide_columns(
+        columns, index, table, reference_date)] == row_decisions, \
+        "columnar decisions differ from row decisions"
+
+    repeats = -(-rows // sample)
+    big = EntryColumns(columns.codes, **dict(
+        (name, numpy.tile(getattr(columns, name), repeats)[:rows])
+        for name in COLUMNS))
+    start = time.perf_counter()
+    decide_columns(big, index, table, reference_date)
+    vector_time = (time.perf_counter() - start) / rows
+    return row_time, load_time, vector_time
+
+
+#rule functions timed by run_suite, called as rule(entry, table, index, date)
+RULES = [
+    ("is_quarantine", lambda entry, table, index, reference_date:
+        is_quarantine(entry, table)),
+    ("is_reject", lambda entry, table, index, reference_date:
+        is_reject(entry, table, reference_date)),
+    ("is_secondary", lambda entry, table, index, reference_date:
+        is_secondary(entry, index)),
+    ("is_valid_entry_record", lambda entry, table, index, reference_date:
+        is_valid_entry_record(entry, reference_date)),
+    ("is_valid_visa", lambda entry, table, index, reference_date:
+        is_valid_visa(entry, reference_date)),
+]
+
+
+def run_suite(sizes=(1000, 100000, 1000000), seed=1340, **rates):
+    """
+    times decide and each rule function on generated traffic
+    for each size, a JSON entries file is written and decided as a stream,
+        reporting throughput, per-record latency percentiles and peak
+        memory; each rule function is then timed per record
+    :param sizes: numbers of entry records to run
+    :param seed: seed of the traffic generator
+    :param rates: invalid_rate, visa_rate, via_rate and watchlist_rate
+        passed on to traffic.generate_entries
+    :return: dictionary of results, ready to be saved as JSON
+    """
+
+    countries, watch_list = load_reference_data()
+    table = CountryTable(countries)
+    index = WatchlistIndex(watch_list)
+    reference_date = date.today()
+    results = {"python": platform.python_version(),
+               "platform": platform.platform(),
+               "seed": seed, "rates": rates,
+               "reference_date": reference_date.isoformat(), "runs": []}
+
+    for size in sizes:
+        def traffic():
+            return generate_entries(size, countries, watch_list, seed,
+                                    reference_date, **rates)
+        run = {"records": size}
+        with tempfile.TemporaryDirectory() as folder:
+            entries_file = os.path.join(folder, "entries.json")
+            write_entries(entries_file, traffic())
+            run["decide"] = _time_decide(entries_file, table, index,
+                                         reference_date)
+        for name, rule in RULES:
+            latencies = array("q")
+            for entry in traffic():
+                start = time.perf_counter_ns()
+                rule(entry, table, index, reference_date)
+                latencies.append(time.perf_counter_ns() - start)
+            run[name] = _summary(latencies, sum(latencies) / 1e9)
+        results["runs"] += [run]
+    return results
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    """
+    lists the measurements where current is worse than baseline
+    :param baseline: results of an earlier run_suite
+    :param current: results of run_suite to check
+    :param tolerance: fraction a measurement may worsen before it counts
+    :return: list of strings describing each regression
+    """
+
+    regressions = []
+    old_runs = dict((run["records"], run) for run in baseline["runs"])
+    for run in current["runs"]:
+        old_run = old_runs.get(run["records"])
+        if old_run is None:
+            continue
+        for name, stats in sorted(run.items()):
+            if name == "records" or name not in old_run:
+                continue
+            old_stats = old_run[name]
+            for metric, higher_is_better in [("records_per_second", True),
+                                             ("p99_us", False),
+                                             ("peak_memory_bytes", False)]:
+                if metric not in stats or not old_stats.get(metric):
+                    continue
+                change = stats[metric] / old_stats[metric] - 1
+                if higher_is_better and change < -tolerance \
+                        or not higher_is_better and change > tolerance:
+                    regressions += ["{0} records, {1} {2}: {3:.4g} -> {4:.4g}"
+                                    .format(run["records"], name, metric,
+                                            old_stats[metric], stats[metric])]
+    return regressions
+
+
+def _time_decide(entries_file, table, index, reference_date):
+    """
+    decides an entries file three times: once for throughput, once timing
+        each record's decision, and once under tracemalloc for peak memory
+    """
+
+    start = time.perf_counter()
+    with open(entries_file) as json_file:
+        for _ in decide_entries(iter_json_array(json_file), index, table,
+                                reference_date=reference_date):
+            pass
+    seconds = time.perf_counter() - start
+
+    latencies = array("q")
+    with open(entries_file) as json_file:
+        for entry in iter_json_array(json_file):
+            start = time.perf_counter_ns()
+            decide_entry(entry, index, table, reference_date)
+            latencies.append(time.perf_counter_ns() - start)
+
+    tracemalloc.start()
+    with open(entries_file) as json_file:
+        for _ in decide_entries(iter_json_array(json_file), index, table,
+                                reference_date=reference_date):
+            pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    stats = _summary(latencies, seconds)
+    stats["peak_memory_bytes"] = peak
+    return stats
+
+
+def _summary(latencies, seconds):
+    """
+    summarizes per-record latencies in nanoseconds
+    """
+
+    ordered = sorted(latencies)
+    return {"seconds": seconds,
+            "records_per_second": len(ordered) / seconds if seconds else 0,
+            "p50_us": ordered[len(ordered) // 2] / 1e3 if ordered else 0,
+            "p99_us": ordered[len(ordered) * 99 // 100] / 1e3
+            if ordered else 0}
+
+
+def bench_fuzzy_watchlist(size=10 ** 6, lookups=2000, budget_us=1000,
+                          seed=1340, repeated_names=False):
+    """
+    times fuzzy watchlist lookups for travellers who are not listed, a
+        misspelling of a listed name, or one character off a listed passport
+    :param size: number of suspects on the watchlist
+    :param lookups: number of travellers looked up
+    :param budget_us: per-traveller budget in microseconds to report against
+    :param seed: seed for the random watchlist and travellers
+    :param repeated_names: Boolean; True to list suspects under the few
+        names of traffic.FIRST_NAMES and traffic.LAST_NAMES, as real
+        watchlists repeat common names, instead of random letters
+    :return: dictionary with the build seconds, p50 and p99 microseconds per
+        lookup, the budget, and the fraction of lookups over budget
+    """
+
+    from fuzzy_watchlist import FuzzyWatchlistIndex
+
+    rng = random.Random(seed)
+    watch_list = random_watchlist(size, rng)
+    if repeated_names:
+        for suspect in watch_list:
+            if suspect["first_name"]:
+                suspect["first_name"] = rng.choice(FIRST_NAMES)
+                suspect["last_name"] = rng.choice(LAST_NAMES)
+    start = time.perf_counter()
+    index = FuzzyWatchlistIndex(watch_list)
+    build_seconds = time.perf_counter() - start
+
+    travellers = []
+    for number in range(lookups):
+        suspect = rng.choice(watch_list)
+        traveller = {"first_name": "JOHN", "last_name": "SMITH",
+                     "passport": random_passport(rng)}
+        if number % 3 == 1 and suspect["first_name"]:
+            traveller["first_name"] = suspect["first_name"]
+            traveller["last_name"] = suspect["last_name"][:-1] + "E"
+        elif number % 3 == 2 and suspect["passport"]:
+            traveller["passport"] = suspect["passport"][:-1] + "#"
+        travellers += [traveller]
+
+    latencies = array("q")
+    for traveller in travellers:
+        start = time.perf_counter_ns()
+        index.matches(traveller)
+        latencies.append(time.perf_counter_ns() - start)
+    stats = _summary(latencies, sum(latencies) / 1e9)
+    return {"build_seconds": build_seconds, "p50_us": stats["p50_us"],
+            "p99_us": stats["p99_us"], "budget_us": budget_us,
+            "over_budget": sum(1 for latency in latencies
+                               if latency > budget_us * 1e3) / lookups}
+
+
+def bench_loading(size=10 ** 6, seed=1340):
+    """
+    times loading a large watchlist file with the stdlib json module, with
+        the loader's parser, from the loader's on-disk cache, and again in
+        the same process
+    :param size: number of suspects in the watchlist file
+    :param seed: seed for the random watchlist
+    :return: tuple of (stdlib seconds, cold seconds, on-disk cache seconds,
+        in-process seconds)
+    """
+
+    import loader
+
+    with tempfile.TemporaryDirectory() as folder:
+        watchlist_file = os.path.join(folder, "watchlist.json")
+        with open(watchlist_file, "w") as json_file:
+            json.dump(random_watchlist(size, random.Random(seed)), json_file)
+
+        start = time.perf_counter()
+        with open(watchlist_file) as json_file:
+            WatchlistIndex(json.load(json_file))
+        stdlib_seconds = time.perf_counter() - start
+
+        loader.clear_loaded()
+        times = []
+        for use_cache in [False, True, True]:
+            start = time.perf_counter()
+            loader.load_compiled(watchlist_file, WatchlistIndex, use_cache)
+            times += [time.perf_counter() - start]
+        loader.clear_loaded()
+        #the first cached load wrote the on-disk copy; time reading it back
+        start = time.perf_counter()
+        loader.load_compiled(watchlist_file, WatchlistIndex)
+        disk_seconds = time.perf_counter() - start
+        loader.clear_loaded()
+    return stdlib_seconds, times[0], disk_seconds, times[2]
+
+
+def bench_startup(sizes=(1, 10, 100), repeat=5, seed=1340):
+    """
+    times short runs of "python -m papers decide", from starting the
+        process to reading its first line of decisions, with no compiled
+        reference data, with the loader's per-file cache, and with a
+        snapshot
+    papers.py and loader.py are byte-compiled first, as they would be once
+        installed, so the runs do not include compiling them
+    :param sizes: numbers of entries in the small input files
+    :param repeat: number of runs of each kind; the fastest is kept
+    :param seed: seed for the random entries
+    :return: tuple of (seconds to start an interpreter that does nothing,
+        list of (entries, cold seconds, cached seconds, snapshot seconds)
+        tuples)
+    """
+
+    import py_compile
+    import shutil
+    import subprocess
+
+    for name in ["papers.py", "loader.py"]:
+        py_compile.compile(os.path.join(DATA_DIR, name), doraise=True)
+    countries, watch_list = load_reference_data()
+
+    def first_line(command):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable] + command, cwd=DATA_DIR,
+                                   stdout=subprocess.PIPE)
+        process.stdout.readline()
+        seconds = time.perf_counter() - start
+        process.communicate()
+        return seconds
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for name in ["watchlist.json", "countries.json"]:
+            shutil.copy(os.path.join(DATA_DIR, name), folder)
+        reference = ["--watchlist", os.path.join(folder, "watchlist.json"),
+                     "--countries", os.path.join(folder, "countries.json")]
+        snapshot = ["--snapshot", os.path.join(folder, "reference.snapshot")]
+        interpreter_seconds = min(first_line(["-c", "pass"])
+                                  for _ in range(repeat))
+        for size in sizes:
+            entries_file = os.path.join(folder, "entries_{0}.json".format(
+                size))
+            write_entries(entries_file, generate_entries(
+                size, countries, watch_list, seed))
+            command = ["-m", "papers", "decide", entries_file] + reference
+            cold_times = []
+            for _ in range(repeat):
+                shutil.rmtree(os.path.join(folder, "__pycache__"),
+                              ignore_errors=True)
+                cold_times.append(first_line(command))
+            cached_seconds = min(first_line(command) for _ in range(repeat))
+            first_line(command + snapshot)
+            snapshot_seconds = min(first_line(command + snapshot)
+                                   for _ in range(repeat))
+            results.append((size, min(cold_times), cached_seconds,
+                            snapshot_seconds))
+    return interpreter_seconds, results
+
+
+def bench_async_kiosks(clients=1000, submissions=20, seed=1340):
+    """
+    load test of the asyncio front end: each kiosk client submits one
+        traveller at a time and waits for the decision, all clients at once;
+        the same load through threads calling decide_entry is the baseline
+    :param clients: number of concurrent kiosk clients
+    :param submissions: travellers each client submits
+    :param seed: seed for the random entries
+    :return: dictionary of "coalesced" and "threads" result dictionaries,
+        each with seconds, records per second, and p50 and p99 microseconds
+        from submission to decision
+    """
+
+    import asyncio
+    from async_office import AsyncBorderOffice
+    from border_office import BorderOffice
+
+    entries = list(generate_entries(clients * submissions,
+                                    load_reference_data()[0], seed=seed))
+    office = BorderOffice(os.path.join(DATA_DIR, "watchlist.json"),
+                          os.path.join(DATA_DIR, "countries.json"))
+    watch_list, countries = office.reference_data()
+    reference_date = date.today()
+
+    async def kiosk(decide, number, latencies):
+        for entry in entries[number::clients]:
+            start = time.perf_counter_ns()
+            await decide(entry)
+            latencies.append(time.perf_counter_ns() - start)
+
+    async def load_test(decide):
+        latencies = array("q")
+        start = time.perf_counter()
+        await asyncio.gather(*[kiosk(decide, number, latencies)
+                               for number in range(clients)])
+        return _summary(latencies, time.perf_counter() - start)
+
+    async def coalesced():
+        async_office = AsyncBorderOffice(office, reload_interval=None)
+        return await load_test(lambda entry: async_office.decide_record(
+            entry, reference_date))
+
+    async def threads():
+        return await load_test(lambda entry: asyncio.to_thread(
+            decide_entry, entry, watch_list, countries, reference_date))
+
+    return {"coalesced": asyncio.run(coalesced()),
+            "threads": asyncio.run(threads())}
+
+
+def bench_record_memory(count=10 ** 6, seed=1340):
+    """
+    measures the memory of a day's entries held as the nested dictionaries
+        parsed from JSON and as compact EntryRecords
+    :param count: number of entry records
+    :param seed: seed for the random entries
+    :return: tuple of (dictionary bytes per record, compact bytes per record)
+    """
+
+    from papers import compact_entry
+
+    countries, _ = load_reference_data()
+    #parse each record from text, so no strings are shared by accident
+    lines = [json.dumps(entry) for entry in generate_entries(
+        count, countries, seed=seed)]
+
+    tracemalloc.start()
+    entries = [json.loads(line) for line in lines]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    records = [compact_entry(json.loads(line)) for line in lines]
+    compact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del entries, records
+    return dict_bytes / count, compact_bytes / count
+
+
+def bench_input_formats(count=200000, seed=1340):
+    """
+    times decide on the same entries stored as a JSON array, as JSON lines
+        and in the compact format, and the size of each file
+    :param count: number of entry records
+    :param seed: seed for the random entries
+    :return: list of (format, bytes, seconds, records per second) tuples
+    """
+
+    import entry_store
+    from papers import decide_iter
+
+    countries, watch_list = load_reference_data()
+    index = WatchlistIndex(watch_list)
+    reference_date = date.today()
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        array_file = os.path.join(folder, "entries.json")
+        write_entries(array_file, generate_entries(count, countries,
+                                                   watch_list, seed=seed))
+        for name in ["entries.json", "entries.jsonl",
+                     "entries" + entry_store.SUFFIX]:
+            entries_file = os.path.join(folder, name)
+            if entries_file != array_file:
+                entry_store.convert(array_file, entries_file)
+            start = time.perf_counter()
+            for _ in decide_iter(entries_file, index,
+                                 os.path.join(DATA_DIR, "countries.json"),
+                                 reference_date=reference_date):
+                pass
+            seconds = time.perf_counter() - start
+            results += [(name.split(".", 1)[1],
+                         os.path.getsize(entries_file), seconds,
+                         count / seconds)]
+    return results
+
+
+def bench_decision_cache(travellers=50000, visits=500000, maxsize=20000,
+                         skew=1.1, fuzzy=False, seed=1340):
+    """
+    replays repeat-traveller traffic: visits drawn from a pool of
+        travellers with Zipf-like frequencies, so a few cross very often
+        and most rarely, decided directly and through a DecisionCache
+    :param travellers: number of distinct travellers
+    :param visits: number of crossings replayed
+    :param maxsize: size of the cache
+    :param skew: exponent of the Zipf-like distribution
+    :param fuzzy: Boolean; True to check the watchlist with a
+        FuzzyWatchlistIndex, whose lookups cost much more
+    :param seed: seed for the random travellers and visits
+    :return: tuple of (direct seconds per visit, cached seconds per visit,
+        the cache's report dictionary)
+    """
+
+    from decision_cache import DecisionCache
+    from fuzzy_watchlist import FuzzyWatchlistIndex
+
+    countries, watch_list = load_reference_data()
+    table = CountryTable(countries)
+    index = FuzzyWatchlistIndex(watch_list) if fuzzy \
+        else WatchlistIndex(watch_list)
+    reference_date = date.today()
+    pool = list(generate_entries(travellers, countries, watch_list,
+                                 seed=seed))
+    rng = random.Random(seed)
+    weights = [1 / rank ** skew for rank in range(1, travellers + 1)]
+    replay = rng.choices(pool, weights, k=visits)
+
+    direct_time = timeit.timeit(
+        lambda: [decide_entry(entry, index, table, reference_date)
+                 for entry in replay], number=1) / visits
+    cache = DecisionCache(maxsize)
+    cached_time = timeit.timeit(
+        lambda: [cache.decide(entry, index, table, reference_date)
+                 for entry in replay], number=1) / visits
+    return direct_time, cached_time, cache.report()
+
+
+def bench_rule_plan(count=100000, sample=5000, seed=1340,
+                    mixes=((0.05, 0.4), (0.2, 0.1))):
+    """
+    decides generated traffic with decide_entry, with a RulePlan in the
+        default order, and with a RulePlan optimized on a sample of it
+    :param count: number of entry records in each mix
+    :param sample: number of records profiled to optimize the plan
+    :param seed: seed for the random entries
+    :param mixes: list of (invalid_rate, visa_rate) pairs, one per mix
+    :return: list of (invalid_rate, visa_rate, the optimized order, and
+        seconds per record with decide_entry, the default plan and the
+        optimized plan) tuples
+    """
+
+    from rule_plan import RulePlan
+
+    countries, watch_list = load_reference_data()
+    table = CountryTable(countries)
+    index = WatchlistIndex(watch_list)
+    reference_date = date.today()
+    results = []
+    for invalid_rate, visa_rate in mixes:
+        entries = list(generate_entries(count, countries, watch_list, seed,
+                                        invalid_rate=invalid_rate,
+                                        visa_rate=visa_rate))
+        plan = RulePlan()
+        optimized = plan.optimize(entries[:sample], table, reference_date)
+        times = [min(timeit.repeat(
+            lambda: [decide(entry, index, table, reference_date)
+                     for entry in entries], number=1, repeat=3)) / count
+            for decide in [decide_entry, plan.decide, optimized.decide]]
+        results.append((invalid_rate, visa_rate, optimized.order) +
+                       tuple(times))
+    return results
+
+
+def run_micro_benchmarks():
+    """
+    prints the benchmarks of the individual optimizations
+    """
+
+    print("watchlist lookups (microseconds per traveller)")
+    print("{0:>10} {1:>12} {2:>12}".format("size", "scan", "index"))
+    for size, scan_time, index_time in bench_watchlist():
+        print("{0:>10} {1:>12.2f} {2:>12.3f}".format(
+            size, scan_time * 1e6, index_time * 1e6))
+
+    print()
+    print("country rules (microseconds per record)")
+    print("{0:>14} {1:>12} {2:>12}".format("check", "dictionary", "table"))
+    for check, dict_time, table_time in bench_country_rules():
+        print("{0:>14} {1:>12.3f} {2:>12.3f}".format(
+            check, dict_time * 1e6, table_time * 1e6))
+
+    print()
+    print("date checks (microseconds per record)")
+    print("{0:>12} {1:>12}".format("strptime", "cached"))
+    print("{0:>12.3f} {1:>12.3f}".format(*[seconds * 1e6
+                                          for seconds in bench_dates()]))
+
+    print()
+    print("columnar engine at 10M rows (microseconds per record)")
+    print("{0:>12} {1:>12} {2:>12}".format("rows", "load", "vectorized"))
+    try:
+        print("{0:>12.3f} {1:>12.3f} {2:>12.3f}".format(
+            *[seconds * 1e6 for seconds in bench_columnar()]))
+    except ImportError:
+        print("numpy is not installed")
+
+    print()
+    print("fuzzy watchlist, 1M suspects")
+    print(bench_fuzzy_watchlist())
+    print("fuzzy watchlist, 1M suspects under 400 repeated names")
+    print(bench_fuzzy_watchlist(repeated_names=True))
+
+    print()
+    print("loading a 1M suspect watchlist (seconds)")
+    print("{0:>10} {1:>10} {2:>10} {3:>12}".format(
+        "stdlib", "parser", "disk cache", "in process"))
+    print("{0:>10.3f} {1:>10.3f} {2:>10.3f} {3:>12.6f}".format(
+        *bench_loading()))
+
+    print()
+    print("memory of 1M entry records (bytes per record)")
+    print("{0:>12} {1:>12}".format("dictionary", "compact"))
+    print("{0:>12.0f} {1:>12.0f}".format(*bench_record_memory()))
+
+    print()
+    print("decide by input format, 200k records")
+    print("{0:>10} {1:>12} {2:>10} {3:>12}".format(
+        "format", "bytes", "seconds", "records/s"))
+    for result in bench_input_formats():
+        print("{0:>10} {1:>12} {2:>10.2f} {3:>12.0f}".format(*result))
+
+    print()
+    print("repeat travellers through a decision cache")
+    print("{0:>10} {1:>10} {2:>10} {3:>10} {4:>10}".format(
+        "watchlist", "direct us", "cached us", "hit rate", "evictions"))
+    for fuzzy in [False, True]:
+        direct_time, cached_time, report = bench_decision_cache(fuzzy=fuzzy)
+        print("{0:>10} {1:>10.3f} {2:>10.3f} {3:>10.3f} {4:>10}".format(
+            "fuzzy" if fuzzy else "exact", direct_time * 1e6,
+            cached_time * 1e6, report["hit_rate"], report["evictions"]))
+
+    print()
+    print("reject check order (microseconds per record)")
+    print("{0:>8} {1:>6} {2:>10} {3:>10} {4:>10}  {5}".format(
+        "invalid", "visa", "decide", "default", "optimized", "order"))
+    for invalid_rate, visa_rate, order, decide_time, default_time, \
+            optimized_time in bench_rule_plan():
+        print("{0:>8.2f} {1:>6.2f} {2:>10.3f} {3:>10.3f} {4:>10.3f}  {5}"
+              .format(invalid_rate, visa_rate, decide_time * 1e6,
+                      default_time * 1e6, optimized_time * 1e6,
+                      ", ".join(order)))
+
+    print()
+    interpreter_seconds, startup_results = bench_startup()
+    print("python -m papers decide, time to first decision (milliseconds; "
+          "{0:.1f} to start python)".format(interpreter_seconds * 1e3))
+    print("{0:>10} {1:>10} {2:>10} {3:>10}".format(
+        "entries", "cold", "cached", "snapshot"))
+    for size, cold_seconds, cached_seconds, snapshot_seconds \
+            in startup_results:
+        print("{0:>10} {1:>10.1f} {2:>10.1f} {3:>10.1f}".format(
+            size, cold_seconds * 1e3, cached_seconds * 1e3,
+            snapshot_seconds * 1e3))
+
+    print()
+    print("1000 concurrent kiosk clients")
+    print("{0:>10} {1:>12} {2:>10} {3:>10}".format(
+        "front end", "records/s", "p50 us", "p99 us"))
+    for name, stats in sorted(bench_async_kiosks().items()):
+        print("{0:>10} {1:>12.0f} {2:>10.1f} {3:>10.1f}".format(
+            name, stats["records_per_second"], stats["p50_us"],
+            stats["p99_us"]))
+
+    print()
+    print("decide_entries scaling")
+    print("{0:>10} {1:>12} {2:>14}".format("workers", "seconds", "records/s"))
+    for workers, seconds, rate in bench_workers():
+        print("{0:>10} {1:>12.2f} {2:>14.0f}".format(workers, seconds, rate))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--suite", action="store_true",
+                        help="run the decide and rule suite on generated "
+                        "traffic instead of the micro benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 100000, 1000000])
+    parser.add_argument("--seed", type=int, default=1340)
+    parser.add_argument("--invalid-rate", type=float, default=0.05)
+    parser.add_argument("--visa-rate", type=float, default=0.4)
+    parser.add_argument("--via-rate", type=float, default=0.2)
+    parser.add_argument("--watchlist-rate", type=float, default=0.01)
+    parser.add_argument("--output", help="JSON file to save results in")
+    parser.add_argument("--baseline",
+                        help="JSON file of earlier results to compare with")
+    arguments = parser.parse_args()
+
+    if not arguments.suite:
+        run_micro_benchmarks()
+        sys.exit(0)
+
+    suite_results = run_suite(arguments.sizes, arguments.seed,
+                              invalid_rate=arguments.invalid_rate,
+                              visa_rate=arguments.visa_rate,
+                              via_rate=arguments.via_rate,
+                              watchlist_rate=arguments.watchlist_rate)
+    print("{0:>10} {1:>22} {2:>12} {3:>10} {4:>10} {5:>12}".format(
+        "records", "measure", "records/s", "p50 us", "p99 us", "peak MB"))
+    for suite_run in suite_results["runs"]:
+        for measure, stats in suite_run.items():
+            if measure == "records":
+                continue
+            peak = "{0:.1f}".format(stats["peak_memory_bytes"] / 2 ** 20) \
+                if "peak_memory_bytes" in stats else ""
+            print("{0:>10} {1:>22} {2:>12.0f} {3:>10.2f} {4:>10.2f} {5:>12}"
+                  .format(suite_run["records"], measure,
+                          stats["records_per_second"], stats["p50_us"],
+                          stats["p99_us"], peak))
+    if arguments.output:
+        with open(arguments.output, "w") as results_file:
+            json.dump(suite_results, results_file, indent=2)
+    if arguments.baseline:
+        with open(arguments.baseline) as results_file:
+            for regression in compare_results(json.load(results_file),
+                                              suite_results):
+                print("regression: " + regression)
@@ -0,0 +1,232 @@
+""" Resident immigration office that keeps Kanadia's reference data loaded """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import json
+import os
+import threading
+import loader
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from papers import CountryTable
+from papers import decide_entries
+from papers import decide_entry
+from papers import WatchlistIndex
+
+
+class BorderOffice(object):
+    """
+    loads countries and watchlist files once and decides entries against
+        them, reloading a file only when its modification time changes
+    """
+
+    def __init__(self, watchlist_file, countries_file, stats=None,
+                 cache=None):
+        """
+        :param watchlist_file: path of a JSON formatted watchlist file
+        :param countries_file: path of a JSON formatted countries file
+        :param stats: papers.DecisionStats that every decision is counted
+            in, or None to decide without instrumentation
+        :param cache: decision_cache.DecisionCache that single records are
+            decided through, or None; with stats, only the decisions that
+            are not found in the cache are counted
+        """
+
+        self.watchlist_file = watchlist_file
+        self.countries_file = countries_file
+        self.stats = stats
+        self.cache = cache
+        self.reload_errors = 0
+        self.last_reload_error = None
+        self._reload_lock = threading.Lock()
+        #(watchlist mtime, countries mtime, watch_list, countries); replaced
+        #as a whole so a decision never mixes old and new reference data
+        self._data = None
+        self.reload()
+
+    def reload(self):
+        """
+        reads both reference files and swaps them in
+        """
+
+        with self._reload_lock:
+            self._data = self._load()
+
+    def reload_if_changed(self):
+        """
+        reloads the reference data if either file's modification time
+            differs from the one that was loaded
+        a file that is missing or can not be parsed, as while it is being
+            replaced, is not an error: the loaded data is kept, the error is
+            kept in last_reload_error, and the next check tries again
+        :return: Boolean; True if the data was reloaded, False otherwise
+        """
+
+        try:
+            if self._mtimes() == self._data[:2]:
+                return False
+            with self._reload_lock:
+                #another thread may have reloaded while this one waited
+                if self._mtimes() == self._data[:2]:
+                    return False
+                self._data = self._load()
+                self.last_reload_error = None
+        except (OSError, ValueError) as error:
+            with self._reload_lock:
+                self.reload_errors += 1
+                self.last_reload_error = error
+            return False
+        return True
+
+    @property
+    def watch_list(self):
+        return self._data[2]
+
+    @property
+    def countries(self):
+        return self._data[3]
+
+    def reference_data(self):
+        """
+        :return: tuple of (watch_list, countries) from one loaded snapshot,
+            without checking the files for changes
+        """
+
+        return self._data[2:]
+
+    def decide_record(self, entry_record, reference_date=None):
+        """
+        decides whether one traveller's entry into Kanadia should be accepted
+        :param entry_record: the traveller's entry record information
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: string; "Quarantine", "Reject", "Secondary", or "Accept"
+        """
+
+        self.reload_if_changed()
+        return self._decide(entry_record, reference_date)
+
+    def decide_batch(self, entries, workers=1, reference_date=None):
+        """
+        decides a batch of entries against one snapshot of the reference data
+        :param entries: iterable of entry records
+        :param workers: number of processes to spread the entries over
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: list of decision strings, in the same order as entries
+        """
+
+        self.reload_if_changed()
+        data = self._data
+        return list(decide_entries(entries, data[2], data[3], workers,
+                                   reference_date=reference_date,
+                                   stats=self.stats))
+
+    def _decide(self, entry_record, reference_date=None):
+        #decide one record against the loaded snapshot, through the cache
+        watch_list, countries = self._data[2:]
+        if self.cache is None:
+            return decide_entry(entry_record, watch_list, countries,
+                                reference_date, self.stats)
+        return self.cache.decide(entry_record, watch_list, countries,
+                                 reference_date)
+
+    def _mtimes(self):
+        return (os.stat(self.watchlist_file).st_mtime_ns,
+                os.stat(self.countries_file).st_mtime_ns)
+
+    def _load(self):
+        #read the modification times first, so a file replaced while it is
+        #being read is picked up again by the next reload_if_changed
+        mtimes = self._mtimes()
+        #the loader's shared copies are only read here, so they need no copy
+        watch_list = loader.load_compiled(
+            os.path.abspath(self.watchlist_file), WatchlistIndex)
+        countries = loader.load_compiled(
+            os.path.abspath(self.countries_file), CountryTable)
+        return mtimes + (watch_list, countries)
+
+
+def serve(office, host="127.0.0.1", port=8340):
+    """
+    answers decision requests over HTTP until interrupted; see make_server
+    :param office: BorderOffice to decide with
+    :param host: address to listen on
+    :param port: port to listen on
+    """
+
+    server = make_server(office, host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def make_server(office, host="127.0.0.1", port=8340):
+    """
+    makes an HTTP server answering decision requests
+    a POST body holding one JSON entry record gets back one JSON decision
+        string; a body holding a JSON list of records gets back a list
+    a body that is not JSON, or holds something other than entry record
+        objects, gets back status 400, as does a record the rules can not
+        decide; any other failure gets back status 500; either way the
+        body is a JSON object with an "error" message
+    :param office: BorderOffice to decide with
+    :param host: address to listen on
+    :param port: port to listen on; 0 for any free port
+    :return: ThreadingHTTPServer, not yet serving
+    """
+
+    class DecisionHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            #the body can only be read when its length is known
+            try:
+                length = int(self.headers["Content-Length"])
+            except (TypeError, ValueError):
+                length = -1
+            if length < 0:
+                self.answer(400, {"error": "request needs a Content-Length"})
+                return
+            try:
+                request = json.loads(self.rfile.read(length).decode("utf-8"))
+            except ValueError:
+                self.answer(400, {"error": "request body is not JSON"})
+                return
+            records = request if isinstance(request, list) else [request]
+            if not all(isinstance(record, dict) for record in records):
+                self.answer(400, {"error": "entry records must be JSON "
+                                           "objects"})
+                return
+            try:
+                if isinstance(request, list):
+                    answer = office.decide_batch(request)
+                else:
+                    answer = office.decide_record(request)
+            except (AttributeError, KeyError, TypeError) as error:
+                #a field holds a value of a type the rules do not expect
+                self.answer(400, {"error": "entry record can not be "
+                                           "decided: {0}".format(error)})
+                return
+            except Exception as error:
+                self.answer(500, {"error": "{0}: {1}".format(
+                    type(error).__name__, error)})
+                return
+            self.answer(200, answer)
+
+        def answer(self, status, answer):
+            body = json.dumps(answer).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ThreadingHTTPServer((host, port), DecisionHandler)
@@ -0,0 +1,246 @@
+""" Columnar decision engine for replaying large batches of entries """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import datetime
+from datetime import date
+from papers import CountryTable
+from papers import MEDICAL_ADVISORY
+from papers import parse_entry
+from papers import TRANSIT_VISA_REQUIRED
+from papers import VISITOR_VISA_REQUIRED
+from papers import WatchlistIndex
+from papers import years_before
+
+#numpy is only needed for the columnar engine, not for papers.py
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#decisions in order of precedence; decide_columns returns indexes into this
+DECISIONS = ("Accept", "Secondary", "Reject", "Quarantine")
+
+#entry reasons that may need a visa
+VISIT = 1
+TRANSIT = 2
+
+#separates first and last names in the name column
+NAME_SEPARATOR = "\x1f"
+
+#names of the arrays that make up EntryColumns
+COLUMNS = ("complete", "from_code", "via_code", "reason", "birth_day",
+           "visa_day", "passport", "name")
+
+
+class EntryColumns(object):
+    """
+    entry records stored as one numpy array per field
+    complete is True for records that parse_entry accepts; from_code and
+        via_code index into codes, or are -1 when there is no such country;
+        dates are day ordinals, with visa_day 0 when there is no visa; names
+        and passports are only filled in for complete records
+    none of the columns depend on the reference data or the reference date,
+        so the same columns can be decided again after either changes
+    """
+
+    def __init__(self, codes, **columns):
+        """
+        :param codes: list of upper-cased country codes
+        :param columns: one numpy array for each name in COLUMNS
+        """
+
+        self.codes = list(codes)
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.complete)
+
+    def save(self, columns_file):
+        """
+        writes the columns to a numpy .npz file
+        :param columns_file: path of the file to write
+        """
+
+        numpy.savez(columns_file, codes=numpy.array(self.codes, dtype=str),
+                    **dict((name, getattr(self, name)) for name in COLUMNS))
+
+    @classmethod
+    def load(cls, columns_file):
+        """
+        reads columns written by save
+        :param columns_file: path of the .npz file
+        :return: EntryColumns
+        """
+
+        _require_numpy()
+        with numpy.load(columns_file) as saved:
+            return cls([str(code) for code in saved["codes"]],
+                       **dict((name, saved[name]) for name in COLUMNS))
+
+
+def load_columns(entries):
+    """
+    converts entry records to columns, checking each record's format once
+    :param entries: iterable of entry records
+    :return: EntryColumns
+    """
+
+    _require_numpy()
+    code_index = {}
+    columns = dict((name, []) for name in COLUMNS)
+
+    for entry_record in entries:
+        #quarantine is checked on incomplete records too, so the "from" and
+        #"via" countries are read from the record itself
+        columns["from_code"].append(
+            _country_code(entry_record, "from", code_index))
+        columns["via_code"].append(
+            _country_code(entry_record, "via", code_index))
+
+        record = parse_entry(entry_record)
+        if record is None:
+            columns["complete"].append(False)
+            columns["reason"].append(0)
+            columns["birth_day"].append(0)
+            columns["visa_day"].append(0)
+            columns["passport"].append("")
+            columns["name"].append("")
+            continue
+        columns["complete"].append(True)
+        columns["reason"].append(VISIT if record.entry_reason == "VISIT"
+                                 else TRANSIT
+                                 if record.entry_reason == "TRANSIT" else 0)
+        columns["birth_day"].append(record.birth_day)
+        columns["visa_day"].append(record.visa_day or 0)
+        columns["passport"].append(record.passport)
+        columns["name"].append(record.first_name + NAME_SEPARATOR
+                               + record.last_name)
+
+    codes = sorted(code_index, key=code_index.get)
+    return EntryColumns(
+        codes,
+        complete=numpy.array(columns["complete"], dtype=bool),
+        from_code=numpy.array(columns["from_code"], dtype=numpy.int32),
+        via_code=numpy.array(columns["via_code"], dtype=numpy.int32),
+        reason=numpy.array(columns["reason"], dtype=numpy.int8),
+        birth_day=numpy.array(columns["birth_day"], dtype=numpy.int32),
+        visa_day=numpy.array(columns["visa_day"], dtype=numpy.int32),
+        passport=numpy.array(columns["passport"], dtype=str),
+        name=numpy.array(columns["name"], dtype=str))
+
+
+def decide_columns(columns, watch_list, countries, reference_date=None):
+    """
+    decides every entry in the columns at once, with the same precedence as
+        papers.decide: Quarantine, then Reject, then Secondary, then Accept
+    :param columns: EntryColumns
+    :param watch_list: a WatchlistIndex, or the list of watchlist entries
+    :param countries: a CountryTable, or the dictionary of country data
+        keyed by country code
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :return: numpy array of indexes into DECISIONS, one per entry
+    """
+
+    _require_numpy()
+    if not isinstance(watch_list, WatchlistIndex):
+        watch_list = WatchlistIndex(watch_list)
+    if not isinstance(countries, CountryTable):
+        countries = CountryTable(countries)
+    if reference_date is None:
+        reference_date = date.today()
+
+    #flags of each country code, with a last entry of 0 for "no country"
+    #that code -1 selects; unknown countries have flags -1
+    flags = numpy.array([countries.flags(code, -1) for code in columns.codes]
+                        + [0], dtype=numpy.int32)
+    from_flags = flags[columns.from_code]
+    via_flags = flags[columns.via_code]
+    from_known = from_flags >= 0
+    from_flags = numpy.where(from_known, from_flags, 0)
+    via_flags = numpy.where(via_flags >= 0, via_flags, 0)
+
+    quarantine = ((from_flags | via_flags) & MEDICAL_ADVISORY) != 0
+
+    #dates must be neither in the future nor more than 150 years back
+    today = reference_date.toordinal()
+    oldest = datetime.date(reference_date.year - 150, 1, 1).toordinal()
+    has_visa = columns.visa_day != 0
+    valid = columns.complete \
+        & (columns.birth_day <= today) & (columns.birth_day >= oldest) \
+        & (~has_visa | ((columns.visa_day <= today)
+                        & (columns.visa_day >= oldest)))
+    needs_visa = ((columns.reason == TRANSIT)
+                  & ((from_flags & TRANSIT_VISA_REQUIRED) != 0)) \
+        | ((columns.reason == VISIT)
+           & ((from_flags & VISITOR_VISA_REQUIRED) != 0))
+    current_visa = columns.visa_day \
+        > years_before(reference_date, 2).toordinal()
+    reject = ~valid | ~from_known | (needs_visa & ~current_visa)
+
+    #hashed join of the name and passport columns against the watchlist
+    names = numpy.array([first + NAME_SEPARATOR + last
+                         for first, last in watch_list.names], dtype=str)
+    passports = numpy.array(sorted(watch_list.passports), dtype=str)
+    secondary = columns.complete \
+        & (numpy.isin(columns.name, names)
+           | numpy.isin(columns.passport, passports))
+
+    #later assignments win, which gives the precedence of papers.decide
+    decisions = numpy.zeros(len(columns), dtype=numpy.int8)
+    decisions[secondary] = 1
+    decisions[reject] = 2
+    decisions[quarantine] = 3
+    return decisions
+
+
+def decide_entries_columnar(entries, watch_list, countries,
+                            reference_date=None):
+    """
+    decides entry records with the columnar engine
+    :param entries: iterable of entry records
+    :param watch_list: a WatchlistIndex, or the list of watchlist entries
+    :param countries: a CountryTable, or the dictionary of country data
+        keyed by country code
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :return: list of strings, one per entry; possible values are
+        "Quarantine", "Reject", "Secondary", and "Accept"
+    """
+
+    decisions = decide_columns(load_columns(entries), watch_list, countries,
+                               reference_date)
+    return [DECISIONS[decision] for decision in decisions]
+
+
+def _country_code(entry_record, location, code_index):
+    """
+    finds the category number of a record's "from" or "via" country
+    :param entry_record: the traveller's entry record information
+    :param location: "from" or "via"
+    :param code_index: dictionary of category numbers by country code,
+        extended with codes not seen before
+    :return: int category number, or -1 if the record has no such country
+    """
+
+    if location not in entry_record \
+            or "country" not in entry_record[location]:
+        return -1
+    code = entry_record[location]["country"].upper()
+    if code not in code_index:
+        code_index[code] = len(code_index)
+    return code_index[code]
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("the columnar engine requires numpy")
@@ -0,0 +1,181 @@
+""" Bounded cache of decisions for travellers who are seen again """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import collections
+import threading
+import time
+from datetime import date
+from papers import CountryTable
+from papers import decide_entry
+from papers import EntryRecord
+from papers import WatchlistIndex
+
+#stands in for a missing field, which the rules treat unlike any value
+_MISSING = object()
+
+
+class DecisionCache(object):
+    """
+    least recently used cache of decisions, with an optional time to live
+    decisions are keyed by a fingerprint of the fields the rules read, the
+        reference date, and the version stamps of the countries table and
+        watchlist index; the first decision against a different table or
+        index empties the cache, so reference data changes never return a
+        stale decision
+    safe to share between threads
+    """
+
+    def __init__(self, maxsize=100000, ttl=None, clock=time.monotonic):
+        """
+        :param maxsize: most decisions kept; the least recently used one is
+            evicted to make room
+        :param ttl: seconds a decision is kept, or None to keep it until it
+            is evicted
+        :param clock: function returning the current time in seconds
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._decisions = collections.OrderedDict()
+        self._versions = None
+        self._lock = threading.Lock()
+
+    def decide(self, entry_record, watch_list, countries, reference_date=None):
+        """
+        decides like papers.decide_entry, reusing an earlier decision for a
+            record with the same fingerprint
+        :param entry_record: the traveller's entry record information, or an
+            EntryRecord
+        :param watch_list: a WatchlistIndex, or the list of watchlist entries
+        :param countries: a CountryTable, or the dictionary of country data
+            keyed by country code
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: string; "Quarantine", "Reject", "Secondary", or "Accept"
+        """
+
+        #plain reference data has no version stamp, so it is converted here
+        #and nothing decided against it can be reused
+        if not isinstance(watch_list, WatchlistIndex):
+            watch_list = WatchlistIndex(watch_list)
+        if not isinstance(countries, CountryTable):
+            countries = CountryTable(countries)
+        if reference_date is None:
+            reference_date = date.today()
+
+        key = (reference_date, fingerprint(entry_record))
+        versions = (countries.version, watch_list.version)
+
+        with self._lock:
+            if versions != self._versions:
+                if self._decisions:
+                    self.invalidations += 1
+                    self._decisions.clear()
+                self._versions = versions
+            try:
+                cached = self._decisions.get(key)
+            except TypeError:
+                #the record holds an unhashable value; decide it uncached
+                cached = key = None
+            if cached is not None:
+                decision, expires = cached
+                if expires is None or expires > self.clock():
+                    self._decisions.move_to_end(key)
+                    self.hits += 1
+                    return decision
+                del self._decisions[key]
+                self.expirations += 1
+            self.misses += 1
+
+        decision = decide_entry(entry_record, watch_list, countries,
+                                reference_date)
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            #reference data may have been swapped while deciding
+            if key is not None and versions == self._versions:
+                self._decisions[key] = (decision, expires)
+                self._decisions.move_to_end(key)
+                while len(self._decisions) > self.maxsize:
+                    self._decisions.popitem(last=False)
+                    self.evictions += 1
+        return decision
+
+    def clear(self):
+        """
+        forgets every cached decision; the counters are kept
+        """
+
+        with self._lock:
+            self._decisions.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self):
+        """
+        :return: dictionary of the counters, ready to be saved as JSON
+        """
+
+        return {"size": len(self._decisions), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hit_rate, "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations}
+
+    def __len__(self):
+        return len(self._decisions)
+
+
+def fingerprint(entry_record):
+    """
+    reduces a record to the fields the rules read, so that two records with
+        the same fingerprint always get the same decision
+    cities, regions and visa codes are only checked for being blank, so
+        only that is kept of them; fields the rules never read are left out
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :return: tuple, which is not hashable if the record holds unhashable
+        values such as lists
+    """
+
+    if entry_record.__class__ is EntryRecord:
+        return ("record", entry_record.first_name, entry_record.last_name,
+                entry_record.passport, entry_record.entry_reason,
+                entry_record.birth_day, entry_record.from_country,
+                entry_record.via_country, entry_record.visa_day)
+
+    get = entry_record.get
+    visa = get("visa", _MISSING)
+    if visa.__class__ is dict:
+        visa = (visa.get("date", ""), visa.get("code", "") == "")
+    return (get("first_name", _MISSING), get("last_name", _MISSING),
+            get("passport", _MISSING), get("entry_reason", _MISSING),
+            get("birth_date", _MISSING), _place_key(get("home", _MISSING)),
+            _place_key(get("from", _MISSING)),
+            _place_key(get("via", _MISSING)), visa)
+
+
+def _place_key(place):
+    #whether the city, region and country are blank, whether there is a
+    #country, and the country code itself
+    if place.__class__ is not dict:
+        return place
+    get = place.get
+    country = get("country", _MISSING)
+    return (get("city", "") == "", get("region", "") == "", country)
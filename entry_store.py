@@ -0,0 +1,228 @@
+""" Compact memory-mapped file format for entry records, and converters """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import json
+import mmap
+import os
+import struct
+import sys
+from papers import COMPACT_SUFFIX
+from papers import EntryRecord
+from papers import JSONL_SUFFIXES
+from papers import open_entries
+from papers import parse_entry
+from traffic import write_entries
+
+#file name suffix of the format
+SUFFIX = COMPACT_SUFFIX
+
+#header: magic, number of records, offset of the string table
+MAGIC = b"KANENT1\0"
+HEADER = struct.Struct("<8sQQ")
+
+#one fixed-size row per record: kind, then string numbers of first name,
+#last name, passport, entry reason, home, from and via country and visa
+#code, then birth and visa day ordinals; -1 is "no string", 0 "no visa"
+ROW = struct.Struct("<Bxxx10i")
+COMPACT = 0
+RAW_JSON = 1
+
+#string table: number of strings, then one more offset than strings
+COUNT = struct.Struct("<Q")
+OFFSET = struct.Struct("<Q")
+
+
+def write_records(entries_file, entries):
+    """
+    writes entry records in the compact format
+    records that parse_entry accepts are stored as the fields of an
+        EntryRecord; any other record is stored as its JSON text, so it
+        reads back exactly as it was
+    every distinct string is stored once, in a table after the rows
+    :param entries_file: path of the file to write
+    :param entries: iterable of entry records or EntryRecords
+    :return: int number of records written
+    """
+
+    strings = {}
+
+    def number(string):
+        if string is None:
+            return -1
+        if string not in strings:
+            strings[string] = len(strings)
+        return strings[string]
+
+    count = 0
+    with open(entries_file, "wb") as binary_file:
+        binary_file.write(HEADER.pack(MAGIC, 0, 0))
+        for entry_record in entries:
+            record = entry_record if isinstance(entry_record, EntryRecord) \
+                else parse_entry(entry_record)
+            if record is None:
+                binary_file.write(ROW.pack(
+                    RAW_JSON, number(json.dumps(entry_record)),
+                    -1, -1, -1, -1, -1, -1, -1, 0, 0))
+            else:
+                binary_file.write(ROW.pack(
+                    COMPACT, number(record.first_name),
+                    number(record.last_name), number(record.passport),
+                    number(record.entry_reason), number(record.home_country),
+                    number(record.from_country), number(record.via_country),
+                    number(record.visa_code), record.birth_day,
+                    record.visa_day or 0))
+            count += 1
+
+        table_offset = binary_file.tell()
+        encoded = [string.encode("utf-8") for string in strings]
+        binary_file.write(COUNT.pack(len(encoded)))
+        offset = 0
+        for string in encoded:
+            binary_file.write(OFFSET.pack(offset))
+            offset += len(string)
+        binary_file.write(OFFSET.pack(offset))
+        for string in encoded:
+            binary_file.write(string)
+
+        binary_file.seek(0)
+        binary_file.write(HEADER.pack(MAGIC, count, table_offset))
+    return count
+
+
+def write_jsonl(entries_file, entries):
+    """
+    writes entry records as line-delimited JSON, one record per line
+    :param entries_file: path of the file to write
+    :param entries: iterable of entry records
+    :return: int number of records written
+    """
+
+    count = 0
+    with open(entries_file, "w") as jsonl_file:
+        for entry_record in entries:
+            jsonl_file.write(json.dumps(entry_record) + "\n")
+            count += 1
+    return count
+
+
+def iter_records(entries_file):
+    """
+    scans a file in the compact format without reading it into memory
+    the file is memory-mapped and the rows are unpacked straight from the
+        mapping; each distinct string is decoded once and then shared
+    :param entries_file: path of the file
+    :return: iterator of EntryRecords, and of entry record dictionaries for
+        records that were stored as JSON text, in the order written
+    :raises ValueError: if the file is not in the compact format
+    """
+
+    with open(entries_file, "rb") as binary_file, \
+            mmap.mmap(binary_file.fileno(), 0,
+                      access=mmap.ACCESS_READ) as mapping:
+        view = memoryview(mapping)
+        rows = None
+        try:
+            magic, count, table_offset = HEADER.unpack_from(view)
+            if magic != MAGIC:
+                raise ValueError("{0} is not an entries file".format(
+                    entries_file))
+            string_count, = COUNT.unpack_from(view, table_offset)
+            offsets_start = table_offset + COUNT.size
+            blob_start = offsets_start + (string_count + 1) * OFFSET.size
+            strings = [None] * string_count
+
+            def string(number):
+                if number < 0:
+                    return None
+                if strings[number] is None:
+                    start, = OFFSET.unpack_from(
+                        view, offsets_start + number * OFFSET.size)
+                    end, = OFFSET.unpack_from(
+                        view, offsets_start + (number + 1) * OFFSET.size)
+                    strings[number] = str(
+                        mapping[blob_start + start:blob_start + end],
+                        "utf-8")
+                return strings[number]
+
+            rows = view[HEADER.size:HEADER.size + count * ROW.size]
+            for row in ROW.iter_unpack(rows):
+                if row[0] == RAW_JSON:
+                    yield json.loads(string(row[1]))
+                    continue
+                yield EntryRecord(string(row[1]), string(row[2]),
+                                  string(row[3]), string(row[4]), row[9],
+                                  string(row[5]), string(row[6]),
+                                  string(row[7]), row[10] or None,
+                                  string(row[8]))
+        finally:
+            #the views must be released before the mapping can be closed
+            if rows is not None:
+                rows.release()
+            view.release()
+
+
+def convert(source_file, destination_file):
+    """
+    converts entry records between formats, chosen by file name suffix:
+        papers.JSONL_SUFFIXES for one JSON record per line, SUFFIX for the
+        compact format, and a JSON array for anything else
+    records converted to a JSON format from the compact one are written
+        as they were stored, so incomplete records keep every field and
+        complete ones keep only what the rules read
+    :param source_file: path of the file to read
+    :param destination_file: path of the file to write
+    :return: int number of records converted
+    """
+
+    with open_entries(source_file) as entries:
+        if destination_file.endswith(SUFFIX):
+            return write_records(destination_file, entries)
+        entries = (as_json(entry_record) for entry_record in entries)
+        if destination_file.endswith(JSONL_SUFFIXES):
+            return write_jsonl(destination_file, entries)
+        return write_entries(destination_file, entries)
+
+
+def as_json(entry_record):
+    """
+    gives the fields of an EntryRecord in the shape of an entry record, so
+        it can be written as JSON; cities and regions, which are not kept,
+        are written as "-"
+    :param entry_record: an EntryRecord, or an entry record dictionary,
+        which is returned as it is
+    :return: entry record dictionary
+    """
+
+    if not isinstance(entry_record, EntryRecord):
+        return entry_record
+    entry = {"first_name": entry_record.first_name,
+             "last_name": entry_record.last_name,
+             "passport": entry_record.passport,
+             "birth_date": entry_record.birth_date.isoformat(),
+             "entry_reason": entry_record.entry_reason.lower()}
+    for location, country in [("home", entry_record.home_country),
+                              ("from", entry_record.from_country),
+                              ("via", entry_record.via_country)]:
+        if country is not None:
+            entry[location] = {"city": "-", "region": "-",
+                               "country": country}
+    if entry_record.visa_day is not None:
+        entry["visa"] = {"date": entry_record.visa_date.isoformat(),
+                         "code": entry_record.visa_code}
+    return entry
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python entry_store.py SOURCE DESTINATION")
+    print("{0} records converted to {1}".format(
+        convert(sys.argv[1], sys.argv[2]),
+        os.path.abspath(sys.argv[2])))
@@ -0,0 +1,304 @@
+""" Fuzzy and phonetic watchlist matching for Kanadia's border """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import collections
+import itertools
+import os
+from array import array
+import loader
+from papers import EntryRecord
+from papers import WatchlistIndex
+
+#characters in each n-gram of the name and passport indexes; 4 keeps the
+#posting lists short for watchlists of millions of entries
+GRAM_SIZE = 4
+
+#most names of one Soundex bucket scored per lookup, so that a crowded
+#bucket can not blow the lookup budget; a name past the cap is still
+#found by the n-gram index when it is within threshold
+MAX_PHONETIC_CANDIDATES = 200
+
+#letter groups of American Soundex; vowels, H, W and Y have no digit
+SOUNDEX_DIGITS = dict((letter, str(digit))
+                      for digit, letters in enumerate(
+                          ["", "BFPV", "CGJKQSXZ", "DT", "L", "MN", "R"])
+                      for letter in letters)
+
+
+class FuzzyWatchlistIndex(WatchlistIndex):
+    """
+    watchlist index that also catches spelling and transliteration variants
+        of listed names and passport numbers, such as OGLESBY and OGLESBEE
+    exact matches are found first, as in WatchlistIndex; otherwise
+        candidates are retrieved from a character n-gram index and from a
+        Soundex index of (first, last) names, and each candidate is scored
+        by edit distance similarity: 1 - distance / length of the longer
+        string
+    the n-gram lookup only reads the postings of the n * k + 3 rarest
+        n-grams of the query, where k is the most edits the threshold
+        allows, and keeps strings found in at least 3 of them, which still
+        finds every string within k edits; very short queries, which may
+        share no n-gram at all, only find strings sharing one
+    """
+
+    def __init__(self, watch_list=(), threshold=0.85, phonetic_threshold=0.7,
+                 passport_threshold=0.9):
+        """
+        :param watch_list: list of watchlist entries, each with "first_name",
+            "last_name" and "passport" keys
+        :param threshold: similarity a full name needs to match
+        :param phonetic_threshold: lower similarity that is enough when the
+            first and last names also sound alike
+        :param passport_threshold: similarity a passport number needs to
+            match
+        """
+
+        self.threshold = threshold
+        self.phonetic_threshold = phonetic_threshold
+        self.passport_threshold = passport_threshold
+        self._names = _NgramIndex()
+        self._passports = _NgramIndex()
+        self._sounds = {}
+        WatchlistIndex.__init__(self, watch_list)
+
+    @classmethod
+    def from_file(cls, watchlist_file, threshold=0.85,
+                  phonetic_threshold=0.7, passport_threshold=0.9):
+        """
+        builds an index from a JSON formatted watchlist file, through the
+            loader's cache; the thresholds are only read by lookups, so one
+            cached index serves every set of them
+        :param watchlist_file: path of the JSON formatted watchlist
+        :param threshold: as for the constructor
+        :param phonetic_threshold: as for the constructor
+        :param passport_threshold: as for the constructor
+        :return: FuzzyWatchlistIndex of its own, which may be added to
+        """
+
+        index = loader.load_compiled(os.path.abspath(watchlist_file),
+                                     cls).copy()
+        index.threshold = threshold
+        index.phonetic_threshold = phonetic_threshold
+        index.passport_threshold = passport_threshold
+        return index
+
+    def add(self, suspect):
+        """
+        adds one watchlist entry to the exact and the fuzzy indexes
+        :param suspect: dictionary with "first_name", "last_name" and
+            "passport" keys; missing or blank fields are skipped
+        """
+
+        first_name = suspect.get("first_name", "").upper()
+        last_name = suspect.get("last_name", "").upper()
+        passport = suspect.get("passport", "")
+        #a name or passport already listed is not indexed again, so repeated
+        #names do not pile up in the postings and Soundex buckets
+        new_name = (first_name, last_name) not in self.names
+        new_passport = passport not in self.passports
+        WatchlistIndex.add(self, suspect)
+        if first_name != "" and last_name != "" and new_name:
+            number = self._names.add(first_name + " " + last_name)
+            self._sounds.setdefault(
+                (soundex(first_name), soundex(last_name)), []).append(number)
+        if passport != "" and new_passport:
+            self._passports.add(passport.upper())
+
+    def matches(self, entry_record):
+        """
+        checks a traveller against the watchlist, exactly and then fuzzily
+        :param entry_record: the traveller's entry record information, or an
+            EntryRecord
+        :return: Boolean; True if the name or passport is on the watchlist
+            or close enough to an entry on it
+        """
+
+        if WatchlistIndex.matches(self, entry_record):
+            return True
+        return self.best_match(entry_record) is not None
+
+    def best_match(self, entry_record):
+        """
+        finds the closest fuzzy match for a traveller
+        :param entry_record: the traveller's entry record information, or an
+            EntryRecord
+        :return: tuple of (score, watchlisted name or passport), or None if
+            nothing scores over its threshold
+        """
+
+        if isinstance(entry_record, EntryRecord):
+            first_name = entry_record.first_name
+            last_name = entry_record.last_name
+            passport = entry_record.passport
+        else:
+            first_name = entry_record.get("first_name", "").upper()
+            last_name = entry_record.get("last_name", "").upper()
+            passport = entry_record.get("passport", "")
+
+        best = None
+        if first_name != "" and last_name != "":
+            name = first_name + " " + last_name
+            best = self._names.closest(name, self.threshold)
+            for number in itertools.islice(self._sounds.get(
+                    (soundex(first_name), soundex(last_name)), ()),
+                    MAX_PHONETIC_CANDIDATES):
+                score = similarity(name, self._names.strings[number],
+                                   self.phonetic_threshold)
+                if score >= self.phonetic_threshold \
+                        and (best is None or score > best[0]):
+                    best = (score, self._names.strings[number])
+        if passport != "":
+            match = self._passports.closest(passport.upper(),
+                                            self.passport_threshold)
+            if match is not None and (best is None or match[0] > best[0]):
+                best = match
+        return best
+
+
+class _NgramIndex(object):
+    """
+    strings with a posting list of string numbers for each n-gram
+    """
+
+    def __init__(self, size=GRAM_SIZE):
+        self.size = size
+        self.strings = []
+        self.postings = {}
+
+    def add(self, string):
+        number = len(self.strings)
+        self.strings.append(string)
+        for gram in ngrams(string, self.size):
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array("i")
+            postings.append(number)
+        return number
+
+    def closest(self, query, threshold):
+        """
+        finds the most similar indexed string
+        :param query: string to look up
+        :param threshold: smallest similarity that counts as a match
+        :return: tuple of (score, string), or None if nothing scores at
+            least threshold
+        """
+
+        #a string within the threshold differs by at most max_edits edits,
+        #and each edit changes at most size n-grams, so it shares at least
+        #min_shared of the query's n-grams, and at least needed of the
+        #size * max_edits + needed rarest ones, which are all that is read
+        max_edits = int((1 - threshold) * len(query) / threshold)
+        grams = sorted(ngrams(query, self.size),
+                       key=lambda gram: len(self.postings.get(gram, ())))
+        min_shared = len(grams) - self.size * max_edits
+        needed = max(1, min(min_shared, 3))
+        counts = collections.Counter()
+        for gram in grams[:self.size * max_edits + needed]:
+            counts.update(self.postings.get(gram, ()))
+
+        #keep the strings counted at least needed times, filtering in C
+        candidates = itertools.compress(counts.keys(),
+                                        map(needed.__le__, counts.values()))
+        #the edit distance is dear, so a candidate is first checked to share
+        #enough n-grams in all for the edits its own length allows, which
+        #skips strings that only share a first or last name with the query
+        query_grams = set(grams)
+        best = None
+        for number in candidates:
+            string = self.strings[number]
+            edits = int((1 - threshold) * max(len(query), len(string)))
+            shared = len(query_grams) - self.size * edits
+            if shared > needed and len(query_grams.intersection(
+                    ngrams(string, self.size))) < shared:
+                continue
+            score = similarity(query, string, threshold)
+            if score >= threshold and (best is None or score > best[0]):
+                best = (score, string)
+        return best
+
+
+def ngrams(string, size=GRAM_SIZE):
+    """
+    :param string: string to split
+    :param size: number of characters in each n-gram
+    :return: set of the string's n-grams, padded at both ends
+    """
+
+    padded = "$" * (size - 1) + string + "$" * (size - 1)
+    return set(padded[position:position + size]
+               for position in range(len(padded) - size + 1))
+
+
+def soundex(name):
+    """
+    computes the American Soundex code of a name
+    :param name: upper-cased name
+    :return: string of a letter and three digits, or "" if the name has no
+        letters
+    """
+
+    letters = [letter for letter in name if "A" <= letter <= "Z"]
+    if not letters:
+        return ""
+    code = letters[0]
+    previous = SOUNDEX_DIGITS.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = SOUNDEX_DIGITS.get(letter, "")
+        if digit != "" and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        #H and W do not separate letters with the same digit
+        if letter not in "HW":
+            previous = digit
+    return (code + "000")[:4]
+
+
+def similarity(first, second, threshold=0.0):
+    """
+    scores two strings by edit distance
+    :param first: string
+    :param second: string
+    :param threshold: scores below this may be returned as 0.0 early
+    :return: float from 0.0 to 1.0; 1 - Levenshtein distance / length of
+        the longer string
+    """
+
+    longest = max(len(first), len(second))
+    if longest == 0:
+        return 1.0
+    max_distance = int((1 - threshold) * longest)
+    if abs(len(first) - len(second)) > max_distance:
+        return 0.0
+
+    #only cells within max_distance of the diagonal can lead to a distance
+    #of at most max_distance, so the rest are left at too_far
+    too_far = max_distance + 1
+    previous = [column if column <= max_distance else too_far
+                for column in range(len(second) + 1)]
+    for row, first_char in enumerate(first, 1):
+        low = max(1, row - max_distance)
+        high = min(len(second), row + max_distance)
+        current = [too_far] * (len(second) + 1)
+        if row <= max_distance:
+            current[0] = row
+        for column in range(low, high + 1):
+            current[column] = min(previous[column] + 1,
+                                  current[column - 1] + 1,
+                                  previous[column - 1]
+                                  + (first_char != second[column - 1]))
+        if min(current[low - 1:high + 1]) > max_distance:
+            return 0.0
+        previous = current
+    if previous[-1] > max_distance:
+        return 0.0
+    return 1 - previous[-1] / longest
@@ -0,0 +1,124 @@
+""" Incremental re-decision of entries when reference data changes """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+from datetime import date
+from papers import CountryTable
+from papers import decide_entry
+from papers import WatchlistIndex
+
+
+class IncrementalDecider(object):
+    """
+    keeps a day's entries with their decisions, indexed by "from" and "via"
+        country code and by name and passport number, so that a change to
+        the countries or the watchlist only re-decides the travellers it
+        can affect
+    a FuzzyWatchlistIndex can match names that are not equal, so with one,
+        any watchlist change re-decides every entry
+    """
+
+    def __init__(self, watch_list, countries, reference_date=None):
+        """
+        :param watch_list: a WatchlistIndex, or the list of watchlist entries
+        :param countries: a CountryTable, or the dictionary of country data
+            keyed by country code
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today, and is kept for every later re-decision
+        """
+
+        if not isinstance(watch_list, WatchlistIndex):
+            watch_list = WatchlistIndex(watch_list)
+        if not isinstance(countries, CountryTable):
+            countries = CountryTable(countries)
+        self.watch_list = watch_list
+        self.countries = countries
+        self.reference_date = reference_date or date.today()
+        self.entries = []
+        self.decisions = []
+        self._by_country = {}
+        self._by_name = {}
+        self._by_passport = {}
+
+    def add(self, entries):
+        """
+        decides new entries and indexes them
+        :param entries: iterable of entry records
+        :return: list of decision strings for the new entries, in order
+        """
+
+        decisions = []
+        for entry_record in entries:
+            position = len(self.entries)
+            decision = decide_entry(entry_record, self.watch_list,
+                                    self.countries, self.reference_date)
+            self.entries.append(entry_record)
+            self.decisions.append(decision)
+            decisions.append(decision)
+
+            for location in ["from", "via"]:
+                if location in entry_record \
+                        and "country" in entry_record[location]:
+                    code = entry_record[location]["country"].upper()
+                    self._by_country.setdefault(code, []).append(position)
+            first_name = entry_record.get("first_name", "")
+            last_name = entry_record.get("last_name", "")
+            if first_name != "" and last_name != "":
+                self._by_name.setdefault(
+                    (first_name.upper(), last_name.upper()),
+                    []).append(position)
+            passport = entry_record.get("passport", "")
+            if passport != "":
+                self._by_passport.setdefault(passport, []).append(position)
+        return decisions
+
+    def update(self, watch_list=None, countries=None):
+        """
+        swaps in new reference data and re-decides only the entries whose
+            "from" or "via" country changed, or whose name or passport was
+            added to or removed from the watchlist
+        :param watch_list: new WatchlistIndex or list of watchlist entries,
+            or None to keep the current one
+        :param countries: new CountryTable or dictionary of country data, or
+            None to keep the current one
+        :return: list of (position, old decision, new decision) tuples for
+            the entries whose decision changed, in entry order
+        """
+
+        affected = set()
+        if countries is not None:
+            if not isinstance(countries, CountryTable):
+                countries = CountryTable(countries)
+            for code in self.countries.changed_codes(countries):
+                affected.update(self._by_country.get(code, ()))
+            self.countries = countries
+
+        if watch_list is not None:
+            if not isinstance(watch_list, WatchlistIndex):
+                watch_list = WatchlistIndex(watch_list)
+            if type(watch_list) is not WatchlistIndex \
+                    or type(self.watch_list) is not WatchlistIndex:
+                affected.update(range(len(self.entries)))
+            else:
+                for name in self.watch_list.names ^ watch_list.names:
+                    affected.update(self._by_name.get(name, ()))
+                for passport in \
+                        self.watch_list.passports ^ watch_list.passports:
+                    affected.update(self._by_passport.get(passport, ()))
+            self.watch_list = watch_list
+
+        changes = []
+        for position in sorted(affected):
+            decision = decide_entry(self.entries[position], self.watch_list,
+                                    self.countries, self.reference_date)
+            if decision != self.decisions[position]:
+                changes.append((position, self.decisions[position], decision))
+                self.decisions[position] = decision
+        return changes
@@ -0,0 +1,211 @@
+""" Loading of Kanadia's JSON data files, with a compiled on-disk cache """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import errno
+import json
+import os
+import pickle
+import threading
+
+#folder that relative file names are resolved against
+DATA_DIR = os.path.dirname(os.path.realpath(__file__))
+
+#name of the folder, next to each data file, that compiled copies go in
+CACHE_DIR_NAME = "__pycache__"
+
+#bump when the classes that are cached change, so old copies are not read
+CACHE_VERSION = 2
+
+#the compiled object last loaded in this process for each file and compile
+#function, with the size and modification time it was loaded at; only the
+#latest version is kept, so reloading a changed file does not pile them up
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+def json_loads(text):
+    """
+    parses JSON text with the fastest parser installed; the parser is only
+        imported on first use, so short runs that never parse JSON, such as
+        those reading a snapshot, do not pay for importing it
+    :param text: str or bytes of JSON
+    :return: the parsed JSON value
+    """
+
+    global json_loads
+    #use a faster JSON parser when one is installed
+    try:
+        import orjson
+        json_loads = orjson.loads
+    except ImportError:
+        try:
+            import ujson
+            json_loads = ujson.loads
+        except ImportError:
+            json_loads = json.loads
+    return json_loads(text)
+
+
+def resolve_path(file_name):
+    """
+    finds a data file, relative to the folder papers.py is in unless the
+        name is absolute
+    :param file_name: name or path of the file
+    :return: absolute path of the file
+    :raises FileNotFoundError: if there is no such file
+    """
+
+    path = os.path.join(DATA_DIR, file_name)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+    return path
+
+
+def load_json(file_name):
+    """
+    parses a whole JSON file with the fastest parser available
+    :param file_name: name or path of the file; see resolve_path
+    :return: the parsed JSON value
+    """
+
+    with open(resolve_path(file_name), "rb") as json_file:
+        return json_loads(json_file.read())
+
+
+def load_compiled(file_name, compile_json, use_cache=True):
+    """
+    loads a JSON reference file and compiles it, reusing earlier work
+    in this process, the compiled object is kept until the file's size or
+        modification time changes; across processes, it is pickled next to
+        the file under a name holding a hash of the file's contents, and
+        the copy of an older version is removed when a new one is written
+    the same object may be returned to several callers, so it must be
+        treated as read-only
+    :param file_name: name or path of the file; see resolve_path
+    :param compile_json: function, such as a class, that turns the parsed
+        JSON value into the object to return; must be picklable by name
+    :param use_cache: Boolean; False to always parse and compile the file
+    :return: the compiled object
+    """
+
+    path = resolve_path(file_name)
+    if not use_cache:
+        return compile_json(load_json(path))
+
+    stamp = _stamp(path, compile_json)
+    kind = stamp[3]
+    with _loaded_lock:
+        loaded = _loaded.get((path, kind))
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+
+    #hashlib is only imported when a cached copy has to be found
+    import hashlib
+    with open(path, "rb") as json_file:
+        contents = json_file.read()
+    digest = hashlib.blake2b(contents + kind.encode("utf-8"),
+                             digest_size=16).hexdigest()
+    cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR_NAME)
+    prefix = "{0}.{1}.".format(os.path.basename(path), kind)
+    cache_name = "{0}{1}.v{2}.pickle".format(prefix, digest, CACHE_VERSION)
+
+    compiled = _read_cache(os.path.join(cache_dir, cache_name))
+    if compiled is None:
+        compiled = compile_json(json_loads(contents))
+        if _write_cache(os.path.join(cache_dir, cache_name), compiled):
+            _remove_stale(cache_dir, prefix, cache_name)
+    with _loaded_lock:
+        _loaded[(path, kind)] = (stamp, compiled)
+    return compiled
+
+
+def load_snapshot(snapshot_file, sources):
+    """
+    loads several compiled reference files at once from a snapshot file,
+        creating or refreshing the snapshot when it is missing or any of the
+        files changed since it was written
+    a current snapshot costs one stat per file and one unpickle; neither
+        the JSON files nor their hashes are read
+    :param snapshot_file: path of the snapshot
+    :param sources: list of (file_name, compile_json) pairs; see
+        load_compiled
+    :return: list of the compiled objects, in the order of sources
+    """
+
+    stamps = [_stamp(resolve_path(file_name), compile_json)
+              for file_name, compile_json in sources]
+    snapshot = _read_cache(snapshot_file)
+    if isinstance(snapshot, dict) \
+            and snapshot.get("version") == CACHE_VERSION \
+            and snapshot.get("stamps") == stamps:
+        return snapshot["compiled"]
+
+    compiled = [load_compiled(stamp[0], compile_json)
+                for stamp, (_, compile_json) in zip(stamps, sources)]
+    _write_cache(snapshot_file, {"version": CACHE_VERSION, "stamps": stamps,
+                                 "compiled": compiled})
+    return compiled
+
+
+def clear_loaded():
+    """
+    forgets the compiled objects kept in this process
+    """
+
+    with _loaded_lock:
+        _loaded.clear()
+
+
+def _stamp(path, compile_json):
+    #what identifies one compile of one version of a file
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime_ns,
+            "{0}.{1}".format(compile_json.__module__, compile_json.__name__))
+
+
+def _read_cache(cache_file):
+    #a missing, unreadable or stale copy is not an error; it is rebuilt
+    try:
+        with open(cache_file, "rb") as cached:
+            return pickle.load(cached)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError):
+        return None
+
+
+def _write_cache(cache_file, compiled):
+    #write to a temporary file and rename it, so readers never see half a
+    #copy; a read-only data folder just means there is no cache
+    temporary_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(temporary_file, "wb") as cached:
+            pickle.dump(compiled, cached, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, cache_file)
+    except OSError:
+        try:
+            os.remove(temporary_file)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def _remove_stale(cache_dir, prefix, cache_name):
+    #remove the copies of other versions of the same file and compile
+    #function; another process may be removing them too
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith(".pickle") \
+                and name != cache_name:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
@@ -14,236 +14,1123 @@ import datetime
 import json
 from datetime import date
 import os
+import collections
+import contextlib
+import functools
+import itertools
+import pickle
+import sys
+import threading
+import time
+import loader
 
 
-def decide(input_file, watchlist_file, countries_file):
+def decide(input_file, watchlist_file, countries_file, workers=1,
+           reference_date=None, stats=None, trace=None):
     """
     decides whether each traveller's entry into Kanadia should be accepted
-    :param input_file: name of a JSON formatted file that contains all people's
-        passport information (e.g., number, name, birth date, etc.)
+    :param input_file: name of a file that contains all people's passport
+        information (e.g., number, name, birth date, etc.), as a JSON array,
+        as JSON lines, or in the compact format; see open_entries
     :param watchlist_file: name of a JSON formatted file that contains names
-        and passport numbers on a watchlist
+        and passport numbers on a watchlist, or a prebuilt WatchlistIndex
     :param countries_file: name of a JSON formatted file that contains country
         data, such as whether an entry or transit visa is required, and whether
-        there is currently a medical advisory
+        there is currently a medical advisory, or a prebuilt CountryTable
+    :param workers: number of processes to spread the entries over
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :param stats: DecisionStats that rule timings and outcomes are added to
+    :param trace: function called as trace(entry_record, decision, reason)
+        for each traveller; see decide_entry
     :return: list of strings; possible values of strings are: "Quarantine",
         "Reject", "Secondary", and "Accept"
     """
 
-    #enables test file to be executed in PyCharm
-    __location__ = "{0}\\".format(os.path.realpath(
-        os.path.join(os.getcwd(), os.path.dirname(__file__))))
-
-    #open the json files and load information into dictionaries and lists
-    with open(__location__ + countries_file) as json_countries_data, \
-            open(__location__ + watchlist_file) as json_watchlist_data, \
-            open(__location__ + input_file) as json_entries_data:
-        countries = json.load(json_countries_data)
-        watch_list = json.load(json_watchlist_data)
-        entries = json.load(json_entries_data)
-
-    #the variable "decisions" is the final result which this method returns
-    decisions = []
-    #loop over all the entries in the list that come from input_file
-    for item in entries:
-            #check if traveller meets quarantine criteria
-            if is_quarantine(item, countries):
-                decisions += ["Quarantine"]
-            #check if traveller meets reject criteria
-            elif is_reject(item, countries):
-                decisions += ["Reject"]
-            #check if traveller meets secondary criteria
-            elif is_secondary(item, watch_list):
-                decisions += ["Secondary"]
-            #permitted to enter country if passes all checked criteria
+    return list(decide_iter(input_file, watchlist_file, countries_file,
+                            workers, reference_date, stats, trace))
+
+
+def decide_iter(input_file, watchlist_file, countries_file, workers=1,
+                reference_date=None, stats=None, trace=None, follow=False,
+                poll_interval=0.5):
+    """
+    decides each traveller's entry one at a time, reading input_file
+        incrementally so that memory use does not grow with its size
+    :param input_file: name of a file that contains all people's passport
+        information (e.g., number, name, birth date, etc.), as a JSON array,
+        as JSON lines, or in the compact format; see open_entries
+    :param watchlist_file: name of a JSON formatted file that contains names
+        and passport numbers on a watchlist, or a prebuilt WatchlistIndex
+    :param countries_file: name of a JSON formatted file that contains country
+        data, such as whether an entry or transit visa is required, and whether
+        there is currently a medical advisory, or a prebuilt CountryTable
+    :param workers: number of processes to spread the entries over
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :param stats: DecisionStats that rule timings and outcomes are added to
+    :param trace: function called as trace(entry_record, decision, reason)
+        for each traveller; see decide_entry
+    :param follow: Boolean; True to keep deciding lines appended to a JSON
+        lines input_file, forever; see open_entries
+    :param poll_interval: seconds between checks for appended lines
+    :return: iterator of strings, one per traveller in input_file order;
+        possible values are "Quarantine", "Reject", "Secondary", and "Accept"
+    """
+
+    #load the reference data, reusing the compiled copy when the files have
+    #not changed; relative names are found next to this file, as in PyCharm
+    if isinstance(countries_file, CountryTable):
+        countries = countries_file
+    else:
+        countries = loader.load_compiled(countries_file, CountryTable)
+
+    #build the watchlist index once, unless the caller already has one
+    if isinstance(watchlist_file, WatchlistIndex):
+        watch_list = watchlist_file
+    else:
+        watch_list = loader.load_compiled(watchlist_file, WatchlistIndex)
+
+    #stream the entries so only one traveller is held in memory at a time
+    with open_entries(input_file, follow, poll_interval) as entries:
+        for decision in decide_entries(entries, watch_list, countries,
+                                       workers,
+                                       reference_date=reference_date,
+                                       stats=stats, trace=trace):
+            yield decision
+
+
+def decide_entries(entries, watch_list, countries, workers=1,
+                   chunk_size=2000, reference_date=None, stats=None,
+                   trace=None):
+    """
+    decides a sequence of entry records, optionally on several processes
+    the watchlist and countries are sent to each worker process once, when
+        it starts; after that only chunks of entries and decisions travel
+    :param entries: iterable of entry records
+    :param watch_list: a WatchlistIndex, or the list of watchlist entries
+    :param countries: a CountryTable, or the dictionary of country data
+        keyed by country code
+    :param workers: number of processes; 1 decides in this process
+    :param chunk_size: number of entries sent to a worker at a time
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today, read once for the whole batch
+    :param stats: DecisionStats that rule timings and outcomes are added to;
+        workers count into their own and are merged in as chunks finish
+    :param trace: function called as trace(entry_record, decision, reason)
+        for each traveller, in order, in this process
+    :return: iterator of decision strings, in the same order as entries
+    """
+
+    if not isinstance(watch_list, WatchlistIndex):
+        watch_list = WatchlistIndex(watch_list)
+    if not isinstance(countries, CountryTable):
+        countries = CountryTable(countries)
+    if reference_date is None:
+        reference_date = date.today()
+
+    if workers <= 1:
+        for item in entries:
+            yield decide_entry(item, watch_list, countries, reference_date,
+                               stats, trace)
+        return
+    instrumented = stats is not None or trace is not None
+
+    #keep a bounded number of chunks in flight so a long stream of entries
+    #is never read much further ahead than the workers can decide it
+    entries = iter(entries)
+    pending = collections.deque()
+    #multiprocessing is only imported when workers are used, as importing it
+    #is a large part of a short run's start up time
+    import multiprocessing
+    with multiprocessing.Pool(workers, _init_worker,
+                              (watch_list, countries, reference_date)) as pool:
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(itertools.islice(entries, chunk_size))
+                if not chunk:
+                    break
+                pending.append((chunk, pool.apply_async(
+                    _decide_chunk, (chunk, instrumented))))
+            if not pending:
+                return
+            chunk, result = pending.popleft()
+            decisions, reasons, chunk_stats = result.get()
+            if stats is not None:
+                stats.merge(chunk_stats)
+            if trace is not None:
+                for item, decision, reason in zip(chunk, decisions, reasons):
+                    trace(item, decision, reason)
+            for decision in decisions:
+                yield decision
+
+
+#reference data of a worker process, set once by _init_worker
+_worker_data = {}
+
+
+def _init_worker(watch_list, countries, reference_date):
+    """
+    stores the reference data in a newly started worker process
+    :param watch_list: WatchlistIndex
+    :param countries: a CountryTable, or the dictionary of country data
+        keyed by country code
+    :param reference_date: datetime.date that dates are checked against
+    """
+
+    _worker_data["watch_list"] = watch_list
+    _worker_data["countries"] = countries
+    _worker_data["reference_date"] = reference_date
+
+
+def _decide_chunk(chunk, instrumented=False):
+    """
+    decides a chunk of entries in a worker process
+    :param chunk: list of entry records
+    :param instrumented: Boolean; True to also collect reasons and stats
+    :return: tuple of (list of decision strings in the same order as chunk,
+        list of reasons or None, DecisionStats or None)
+    """
+
+    watch_list = _worker_data["watch_list"]
+    countries = _worker_data["countries"]
+    reference_date = _worker_data["reference_date"]
+    if not instrumented:
+        return [decide_entry(item, watch_list, countries, reference_date)
+                for item in chunk], None, None
+
+    stats = DecisionStats()
+    reasons = []
+    decisions = [decide_entry(item, watch_list, countries, reference_date,
+                              stats, lambda entry, decision, reason:
+                              reasons.append(reason))
+                 for item in chunk]
+    return decisions, reasons, stats
+
+
+def decide_entry(entry_record, watch_list, countries, reference_date=None,
+                 stats=None, trace=None):
+    """
+    decides whether one traveller's entry into Kanadia should be accepted
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param watch_list: a WatchlistIndex, or the list of watchlist entries
+    :param countries: a CountryTable, or the dictionary of country data
+        keyed by country code
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :param stats: DecisionStats that rule timings and outcomes are added to
+    :param trace: function called as trace(entry_record, decision, reason),
+        where reason is one of the REASONS, or None for "Accept"
+    :return: string; "Quarantine", "Reject", "Secondary", or "Accept"
+    """
+
+    if not isinstance(countries, CountryTable):
+        countries = CountryTable(countries)
+    if stats is not None or trace is not None:
+        return _decide_entry_instrumented(entry_record, watch_list, countries,
+                                          reference_date, stats, trace)
+
+    #check if traveller meets quarantine criteria
+    if is_quarantine(entry_record, countries):
+        return "Quarantine"
+    #validate the record once; the remaining rules use the checked record
+    record = validate_entry(entry_record, reference_date)
+    #check if traveller meets reject criteria
+    if record is None or is_reject(record, countries, reference_date):
+        return "Reject"
+    #check if traveller meets secondary criteria
+    elif is_secondary(record, watch_list):
+        return "Secondary"
+    #permitted to enter country if passes all checked criteria
+    else:
+        return "Accept"
+
+
+def _decide_entry_instrumented(entry_record, watch_list, countries,
+                               reference_date, stats, trace):
+    """
+    decides like decide_entry, timing each rule and finding the reason for
+        the decision
+    """
+
+    if stats is None:
+        stats = DecisionStats()
+    if reference_date is None:
+        reference_date = date.today()
+    clock = time.perf_counter
+
+    start = clock()
+    quarantined = is_quarantine(entry_record, countries)
+    stats.add_call("is_quarantine", clock() - start)
+    if quarantined:
+        decision, reason = "Quarantine", MEDICAL_ADVISORY_REASON
+    else:
+        start = clock()
+        record = validate_entry(entry_record, reference_date)
+        stats.add_call("is_valid_entry_record", clock() - start)
+        rejected = record is None
+        if not rejected:
+            start = clock()
+            rejected = is_reject(record, countries, reference_date)
+            stats.add_call("is_reject", clock() - start)
+        if rejected:
+            decision = "Reject"
+            reason = reject_reason(entry_record, countries, reference_date)
+        else:
+            start = clock()
+            on_watchlist = is_secondary(record, watch_list)
+            stats.add_call("is_secondary", clock() - start)
+            if on_watchlist:
+                decision, reason = "Secondary", WATCHLIST_REASON
             else:
-                decisions += ["Accept"]
-    return decisions
+                decision, reason = "Accept", None
+
+    stats.add_decision(decision, reason)
+    if trace is not None:
+        trace(entry_record, decision, reason)
+    return decision
+
+
+#reasons given to DecisionStats and trace functions for each decision
+MEDICAL_ADVISORY_REASON = "medical advisory"
+MISSING_FIELD_REASON = "missing field"
+BAD_DATE_REASON = "bad date"
+BAD_PASSPORT_REASON = "bad passport"
+UNKNOWN_COUNTRY_REASON = "unknown country"
+MISSING_VISA_REASON = "missing visa"
+EXPIRED_VISA_REASON = "expired visa"
+WATCHLIST_REASON = "watchlist"
+REASONS = (MEDICAL_ADVISORY_REASON, MISSING_FIELD_REASON, BAD_DATE_REASON,
+           BAD_PASSPORT_REASON, UNKNOWN_COUNTRY_REASON, MISSING_VISA_REASON,
+           EXPIRED_VISA_REASON, WATCHLIST_REASON)
+
+
+class DecisionStats(object):
+    """
+    counters for instrumenting decide: calls and cumulative seconds per
+        rule function, and counts per decision and per reason
+    safe to share between threads, such as those of a BorderOffice's
+        server; the lock is not pickled, so a copy sent to or from a worker
+        process gets its own
+    """
+
+    def __init__(self):
+        self.rule_calls = collections.Counter()
+        self.rule_seconds = collections.Counter()
+        self.decisions = collections.Counter()
+        self.reasons = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add_call(self, rule, seconds):
+        """
+        records one call of a rule function
+        :param rule: name of the rule function
+        :param seconds: time the call took
+        """
+
+        with self._lock:
+            self.rule_calls[rule] += 1
+            self.rule_seconds[rule] += seconds
+
+    def add_decision(self, decision, reason):
+        """
+        records one traveller's decision
+        :param decision: "Quarantine", "Reject", "Secondary", or "Accept"
+        :param reason: one of the REASONS, or None
+        """
+
+        with self._lock:
+            self.decisions[decision] += 1
+            if reason is not None:
+                self.reasons[reason] += 1
+
+    def merge(self, other):
+        """
+        adds the counts of another DecisionStats to this one
+        :param other: DecisionStats, for example from a worker process
+        """
+
+        with self._lock:
+            self.rule_calls.update(other.rule_calls)
+            self.rule_seconds.update(other.rule_seconds)
+            self.decisions.update(other.decisions)
+            self.reasons.update(other.reasons)
+
+    def report(self):
+        """
+        :return: dictionary of the counters, ready to be saved as JSON
+        """
+
+        with self._lock:
+            return {"rule_calls": dict(self.rule_calls),
+                    "rule_seconds": dict(self.rule_seconds),
+                    "decisions": dict(self.decisions),
+                    "reasons": dict(self.reasons)}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def reject_reason(entry_record, countries, reference_date=None):
+    """
+    finds why a record is rejected, checking in the order a border officer
+        would: completeness, dates, passport, country, then visa
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param countries: a CountryTable, or the dictionary of country data
+        keyed by country code
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :return: one of the reject REASONS, or None if the record is not
+        rejected
+    """
+
+    if not isinstance(countries, CountryTable):
+        countries = CountryTable(countries)
+    if reference_date is None:
+        reference_date = date.today()
+
+    #a compact record is complete and well formatted, so only its dates,
+    #country and visa can be wrong
+    if isinstance(entry_record, EntryRecord):
+        if validate_entry(entry_record, reference_date) is None:
+            return BAD_DATE_REASON
+        from_flags = countries.flags(entry_record.from_country)
+        if from_flags is None:
+            return UNKNOWN_COUNTRY_REASON
+        entry_reason = entry_record.entry_reason
+        if entry_reason == "TRANSIT" and from_flags & TRANSIT_VISA_REQUIRED \
+                or entry_reason == "VISIT" \
+                and from_flags & VISITOR_VISA_REQUIRED:
+            if entry_record.visa_day is None:
+                return MISSING_VISA_REASON
+            if not is_valid_visa(entry_record, reference_date):
+                return EXPIRED_VISA_REASON
+        return None
+
+    #check the record is complete
+    for item in REQUIRED_INFO:
+        if entry_record.get(item, "") == "":
+            return MISSING_FIELD_REASON
+    for location in ["home", "from"] + (["via"] if "via" in entry_record
+                                        else []):
+        if _location_country(entry_record.get(location, "")) is None:
+            return MISSING_FIELD_REASON
+    if "visa" in entry_record:
+        for visa_item in REQUIRED_VISA_INFO:
+            if entry_record["visa"].get(visa_item, "") == "":
+                return MISSING_FIELD_REASON
+
+    #check the dates and the passport number
+    if _checked_date(entry_record["birth_date"], reference_date) is None:
+        return BAD_DATE_REASON
+    if "visa" in entry_record and _checked_date(entry_record["visa"]["date"],
+                                                reference_date) is None:
+        return BAD_DATE_REASON
+    if not PASSPORT_FORMAT.match(entry_record["passport"]):
+        return BAD_PASSPORT_REASON
+
+    #check the country and, if one is needed, the visa
+    from_flags = countries.flags(entry_record["from"]["country"])
+    if from_flags is None:
+        return UNKNOWN_COUNTRY_REASON
+    entry_reason = entry_record["entry_reason"].upper()
+    if entry_reason == "TRANSIT" and from_flags & TRANSIT_VISA_REQUIRED \
+            or entry_reason == "VISIT" and from_flags & VISITOR_VISA_REQUIRED:
+        if "visa" not in entry_record:
+            return MISSING_VISA_REASON
+        if not is_valid_visa(entry_record, reference_date):
+            return EXPIRED_VISA_REASON
+    return None
+
+
+#file name suffixes of line-delimited JSON entry files
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+
+#file name suffix of entry_store's compact format, kept here so that it is
+#recognized without importing entry_store
+COMPACT_SUFFIX = ".entries"
+
+
+@contextlib.contextmanager
+def open_entries(input_file, follow=False, poll_interval=0.5):
+    """
+    opens an entries file in the format its name suffix shows: JSON lines
+        for JSONL_SUFFIXES, the compact format of entry_store for
+        COMPACT_SUFFIX, and a JSON array otherwise
+    :param input_file: name or path of the file; see loader.resolve_path
+    :param follow: Boolean; True to keep waiting for lines appended to a
+        JSON lines file; see iter_jsonl
+    :param poll_interval: seconds between checks for appended lines
+    :return: context manager giving an iterator of entry records, which
+        for the compact format may be EntryRecords
+    :raises ValueError: if follow is True for a file that is not JSON lines
+    """
+
+    path = loader.resolve_path(input_file)
+    if path.endswith(JSONL_SUFFIXES):
+        with open(path) as jsonl_file:
+            yield iter_jsonl(jsonl_file, follow, poll_interval)
+        return
+
+    #only JSON lines can be appended to while they are read
+    if follow:
+        raise ValueError("only JSON lines files can be followed: " + path)
+
+    #the compact format is only imported when it is used
+    if path.endswith(COMPACT_SUFFIX):
+        import entry_store
+        with contextlib.closing(entry_store.iter_records(path)) as records:
+            yield records
+        return
+
+    with open(path) as json_file:
+        yield iter_json_array(json_file)
+
+
+def iter_jsonl(jsonl_file, follow=False, poll_interval=0.5):
+    """
+    parses a file holding one JSON entry record per line; blank lines are
+        skipped
+    with follow, the file is tailed: at its end, it is checked again every
+        poll_interval seconds for appended lines, forever, and a last line
+        without its newline is held back until the writer finishes it
+    :param jsonl_file: open text file
+    :param follow: Boolean; True to wait for appended lines at the end
+    :param poll_interval: seconds between checks for appended lines
+    :return: iterator over the records, in order
+    :raises ValueError: if a line is not valid JSON
+    """
+
+    partial = ""
+    while True:
+        line = jsonl_file.readline()
+        if line == "":
+            if not follow:
+                if partial.strip() != "":
+                    yield loader.json_loads(partial)
+                return
+            time.sleep(poll_interval)
+            continue
+        if not line.endswith("\n"):
+            partial += line
+            continue
+        line = partial + line
+        partial = ""
+        if line.strip() != "":
+            yield loader.json_loads(line)
+
+
+def iter_json_array(json_file, chunk_size=65536):
+    """
+    parses a file holding one top-level JSON array without loading it whole
+    :param json_file: open text file positioned at the start of the array
+    :param chunk_size: number of characters read from the file at a time
+    :return: iterator over the items of the array, in order
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    at_end = False
+    expect = "["
+
+    while True:
+        #skip whitespace, reading more of the file when the buffer runs out
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or at_end:
+                break
+            buffer = json_file.read(chunk_size)
+            position = 0
+            at_end = buffer == ""
+
+        if position == len(buffer):
+            raise ValueError("unexpected end of JSON array")
+
+        #the opening bracket, then an item or "]", then "," or "]", ...
+        char = buffer[position]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("input is not a JSON array")
+            position += 1
+            expect = "first"
+            continue
+        if expect != "item" and char == "]":
+            return
+        if expect == "separator":
+            if char != ",":
+                raise ValueError("expected ',' between JSON array items")
+            position += 1
+            expect = "item"
+            continue
+
+        #decode one item; an item at the very end of the buffer may be cut
+        #off, so keep reading until it is followed by another character,
+        #but fail at once on an item that is malformed within the buffer,
+        #rather than reading the rest of the file looking for its end
+        while True:
+            try:
+                item, item_end = decoder.raw_decode(buffer, position)
+                if item_end < len(buffer) or at_end:
+                    break
+            except json.JSONDecodeError as error:
+                if at_end or not _cut_off(error, buffer):
+                    raise
+            more = json_file.read(chunk_size)
+            at_end = more == ""
+            buffer = buffer[position:] + more
+            position = 0
+        yield item
+        position = item_end
+        expect = "separator"
+
+
+def _cut_off(error, buffer):
+    #a JSON value cut off by the end of the buffer fails there, within the
+    #few characters of a literal, number or escape, or as a string whose
+    #closing quote was not found before the end
+    return error.pos >= len(buffer) - 6 \
+        or error.msg.startswith("Unterminated string")
 
 
 def is_quarantine(entry_record, countries_dict):
     """
     checks whether traveller meets condition for quarantine
-    :param entry_record: the traveller's entry record information
-    :param countries_dict: list of countries requiring a visa,
-        and countries with medical advisories
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param countries_dict: a CountryTable, or the dictionary of countries
+        requiring a visa and countries with medical advisories
     :return: Boolean; Return True if the record meets quarantine
         criteria, False otherwise
     """
 
+    if not isinstance(countries_dict, CountryTable):
+        countries_dict = CountryTable(countries_dict)
+
+    #a checked record already holds upper-cased country codes
+    if isinstance(entry_record, EntryRecord):
+        for country in (entry_record.from_country, entry_record.via_country):
+            if country is not None \
+                    and countries_dict.flags(country, 0) & MEDICAL_ADVISORY:
+                return True
+        return False
+
     #check if "from" country is flagged for medical advisory
-    if "from" in entry_record.keys():
-        if "country" in entry_record["from"].keys():
-            from_country = entry_record["from"]["country"].upper()
-            if entry_record["from"]["country"].upper() \
-                    in countries_dict.keys():
-                if countries_dict[from_country]["medical_advisory"] != "":
-                    return True
+    if "from" in entry_record and "country" in entry_record["from"]:
+        if countries_dict.flags(entry_record["from"]["country"], 0) \
+                & MEDICAL_ADVISORY:
+            return True
 
     #check if "via" country is flagged for medical advisory
-    if "via" in entry_record.keys():
-        if "country" in entry_record["via"].keys():
-            via_country = entry_record["via"]["country"].upper()
-            if entry_record["via"]["country"].upper() in countries_dict.keys():
-                if countries_dict[via_country]["medical_advisory"] != "":
-                    return True
-    else:
-        return False
+    if "via" in entry_record and "country" in entry_record["via"]:
+        if countries_dict.flags(entry_record["via"]["country"], 0) \
+                & MEDICAL_ADVISORY:
+            return True
+    return False
 
 
-def is_reject(entry_record, country_dict):
+def is_reject(entry_record, country_dict, reference_date=None):
     """
     checks whether traveller meets condition for rejection of entry
-    :param entry_record: the traveller's entry record information
-    :param country_dict: list of countries requiring a visa,
-        and countries with medical advisories
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param country_dict: a CountryTable, or the dictionary of countries
+        requiring a visa and countries with medical advisories
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
     :return: Boolean; True if the record meets the reject
         criteria, False otherwise
     """
 
-    #check if entry record is incomplete
-    if not is_valid_entry_record(entry_record):
+    if not isinstance(country_dict, CountryTable):
+        country_dict = CountryTable(country_dict)
+
+    if reference_date is None:
+        reference_date = date.today()
+
+    #check if entry record is incomplete; for an EntryRecord, only the
+    #range of its dates is checked again
+    entry_record = validate_entry(entry_record, reference_date)
+    if entry_record is None:
         return True
     #check if "from" country is in the country file
-    from_country = entry_record["from"]["country"].upper()
-    if not from_country in country_dict.keys() and from_country != "KAN":
+    from_flags = country_dict.flags(entry_record.from_country)
+    if from_flags is None:
         return True
-    #check if transit visa is required, if required, check if the visa is valid
-    elif entry_record["entry_reason"].upper() == "TRANSIT" \
-            and country_dict[from_country]["transit_visa_required"] == "1":
-        if not is_valid_visa(entry_record):
-            return True
-    #check if visitor visa is required, if required, check if the visa is valid
-    elif entry_record["entry_reason"].upper() == "VISIT" \
-            and country_dict[from_country]["visitor_visa_required"] == "1":
-        if not is_valid_visa(entry_record):
-            return True
-    else:
-        return False
+    #check if a transit or visitor visa is required, and if so, if it is valid
+    entry_reason = entry_record.entry_reason
+    if entry_reason == "TRANSIT" and from_flags & TRANSIT_VISA_REQUIRED \
+            or entry_reason == "VISIT" and from_flags & VISITOR_VISA_REQUIRED:
+        return not is_valid_visa(entry_record, reference_date)
+    return False
+
+
+#bit flags stored for each country in a CountryTable
+MEDICAL_ADVISORY = 1
+VISITOR_VISA_REQUIRED = 2
+TRANSIT_VISA_REQUIRED = 4
+
+#version stamps of CountryTable and WatchlistIndex contents; a table or
+#index gets a new one whenever it is built, loaded or changed
+_versions = itertools.count(1)
+
+
+class CountryTable(object):
+    """
+    countries data compiled into one integer of bit flags per upper-cased
+        country code, so each rule check is a single dictionary lookup
+    Kanadia ("KAN") is always known and never needs a visa or advisory
+    version is a number no other table or index in this process has
+    """
+
+    __slots__ = ("_flags", "version")
+
+    def __init__(self, countries_dict=None):
+        """
+        :param countries_dict: dictionary of country data keyed by country
+            code, as loaded from countries.json
+        """
+
+        self._flags = {"KAN": 0}
+        for code, country in (countries_dict or {}).items():
+            flags = 0
+            if country.get("medical_advisory", "") != "":
+                flags |= MEDICAL_ADVISORY
+            if country.get("visitor_visa_required") == "1":
+                flags |= VISITOR_VISA_REQUIRED
+            if country.get("transit_visa_required") == "1":
+                flags |= TRANSIT_VISA_REQUIRED
+            self._flags[code.upper()] = flags
+        self.version = next(_versions)
+
+    @classmethod
+    def from_file(cls, countries_file):
+        """
+        builds a table from a JSON formatted countries file
+        :param countries_file: path of the JSON formatted countries file
+        :return: CountryTable, shared with other callers loading the same
+            unchanged file; see loader.load_compiled
+        """
+
+        return loader.load_compiled(os.path.abspath(countries_file), cls)
+
+    def flags(self, country_code, default=None):
+        """
+        looks up a country
+        :param country_code: country code, in any case
+        :param default: value returned if the country is unknown
+        :return: int of bit flags, or default if the country is unknown
+        """
+
+        return self._flags.get(country_code.upper(), default)
+
+    def changed_codes(self, other):
+        """
+        compares two tables
+        :param other: CountryTable
+        :return: set of country codes added, removed or flagged differently
+            in other
+        """
+
+        return set(code for code in set(self._flags) | set(other._flags)
+                   if self._flags.get(code) != other._flags.get(code))
+
+    def __contains__(self, country_code):
+        return country_code.upper() in self._flags
+
+    def __len__(self):
+        return len(self._flags)
+
+    def __getstate__(self):
+        return self._flags
+
+    def __setstate__(self, state):
+        self._flags = state
+        self.version = next(_versions)
 
 
 def is_secondary(entry_record, watch_list):
     """
     checks whether traveller is on the watchlist and must be sent to secondary
-    :param entry_record: the traveller's entry record information
-    :param watch_list: names of travellers on the watch list
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param watch_list: a WatchlistIndex, or the list of names and passport
+        numbers of travellers on the watch list
     :return: Boolean; True if the record is on the watchlist, False otherwise
     """
 
-    #checks the traveller's name against the watchlist
-    for suspect in watch_list:
-        if entry_record["first_name"].upper() \
-                == suspect["first_name"].upper() \
-                and entry_record["last_name"].upper() \
-                == suspect["last_name"].upper():
-            return True
-        elif entry_record["passport"] == suspect["passport"]:
+    #index a plain watchlist so the lookup below is a hash lookup
+    if not isinstance(watch_list, WatchlistIndex):
+        watch_list = WatchlistIndex(watch_list)
+    return watch_list.matches(entry_record)
+
+
+class WatchlistIndex(object):
+    """
+    hash index over the watchlist, keyed on upper-cased (first, last) names
+    and on passport numbers, so that each lookup costs the same no matter
+    how long the watchlist grows
+    blank fields are never indexed: a suspect listed only by passport can
+    not be matched by a traveller with an empty name, and vice versa
+    version is a number no other table or index in this process has, and
+    changes with every add
+    """
+
+    def __init__(self, watch_list=()):
+        """
+        :param watch_list: list of watchlist entries, each with "first_name",
+            "last_name" and "passport" keys
+        """
+
+        self.names = set()
+        self.passports = set()
+        self.version = next(_versions)
+        for suspect in watch_list:
+            self.add(suspect)
+
+    @classmethod
+    def from_file(cls, watchlist_file):
+        """
+        builds an index from a JSON formatted watchlist file
+        :param watchlist_file: path of the JSON formatted watchlist
+        :return: WatchlistIndex of its own, copied from the one the loader
+            shares between callers loading the same unchanged file, so it
+            may be added to; see loader.load_compiled
+        """
+
+        return loader.load_compiled(os.path.abspath(watchlist_file),
+                                    cls).copy()
+
+    def copy(self):
+        """
+        :return: an independent copy of the index, with a new version
+        """
+
+        return pickle.loads(pickle.dumps(self, pickle.HIGHEST_PROTOCOL))
+
+    def add(self, suspect):
+        """
+        adds one watchlist entry to the index
+        :param suspect: dictionary with "first_name", "last_name" and
+            "passport" keys; missing or blank fields are skipped
+        """
+
+        name = _name_key(suspect)
+        if name is not None:
+            self.names.add(name)
+        passport = suspect.get("passport", "")
+        if passport != "":
+            self.passports.add(passport)
+        self.version = next(_versions)
+
+    def matches(self, entry_record):
+        """
+        checks a traveller against the index
+        :param entry_record: the traveller's entry record information, or an
+            EntryRecord
+        :return: Boolean; True if the name or passport is on the watchlist
+        """
+
+        if isinstance(entry_record, EntryRecord):
+            return entry_record.passport in self.passports \
+                or (entry_record.first_name, entry_record.last_name) \
+                in self.names
+        if entry_record.get("passport", "") in self.passports:
             return True
-    return False
+        return _name_key(entry_record) in self.names
+
+    def __len__(self):
+        return len(self.names) + len(self.passports)
 
+    def __setstate__(self, state):
+        #a copy from another process or the loader's cache may carry a
+        #version that is already used in this one
+        self.__dict__.update(state)
+        self.version = next(_versions)
 
-def is_valid_visa(entry_record):
+
+def _name_key(record):
+    """
+    normalizes a record's names for watchlist lookups
+    :param record: an entry record or a watchlist entry
+    :return: tuple of upper-cased (first, last) names, or None if either
+        name is missing or blank
+    """
+
+    first_name = record.get("first_name", "")
+    last_name = record.get("last_name", "")
+    if first_name == "" or last_name == "":
+        return None
+    return first_name.upper(), last_name.upper()
+
+
+def is_valid_visa(entry_record, reference_date=None):
     """
     checks whether traveller has a valid visa to enter
     assumption: visa dates are based on issue date, not expiry date
-    :param entry_record: the traveller's entry record information
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param reference_date: datetime.date that the visa is checked against;
+        defaults to today
     :return: Boolean; False if visa entry not in record or if visa
         is older than 2 years, True otherwise
     """
 
     #establish the current date
-    now = datetime.datetime.now()
+    if reference_date is None:
+        reference_date = date.today()
+
+    #a checked record's visa date has already been parsed, but may still be
+    #later than the reference date
+    if isinstance(entry_record, EntryRecord):
+        return entry_record.visa_day is not None \
+            and years_before(reference_date, 2).toordinal() \
+            < entry_record.visa_day <= _day_range(reference_date)[1]
 
     #check whether traveller has a visa
     if "visa" not in entry_record.keys():
         return False
     #checks whether visa date format and date range are correct
-    if not valid_date_format(entry_record["visa"]["date"]):
+    if not valid_date_format(entry_record["visa"]["date"], reference_date):
         return False
 
-    #convert the visa date to date/time format
-    record_visa_date = datetime.datetime.strptime(
-        entry_record["visa"]["date"], '%Y-%m-%d')
-
-    #compute the earliest acceptable visa date
-    earliest_issue_date = datetime.date(now.year-2, now.month, now.day)
-
     #compare the visa date to check if within 2 years
-    if datetime.date(record_visa_date.year, record_visa_date.month,
-                     record_visa_date.day) > earliest_issue_date:
-        return True
-    else:
-        return False
+    return parse_date(entry_record["visa"]["date"]) \
+        > years_before(reference_date, 2)
 
 
-def is_valid_entry_record(entry_record):
+def is_valid_entry_record(entry_record, reference_date=None):
     """
     checks if traveller's entry record has all info needed for entrance
-    :param entry_record: the traveller's entry record information
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
     :return: Boolean; True if the format is valid, False otherwise
     """
 
-    #list of all the required info from the traveller's passport
-    required_info = ["home", "first_name", "last_name", "passport",
-                     "entry_reason", "from", "birth_date"]
-    #list of all the required country information
-    required_country_info = ["city", "region", "country"]
-    #list of all the required visa information
-    required_visa_info = ["date", "code"]
+    return validate_entry(entry_record, reference_date) is not None
+
+
+#fields every entry record must have with a non-blank value
+REQUIRED_INFO = ("first_name", "last_name", "passport", "entry_reason",
+                 "birth_date")
+#fields every "home", "from" and "via" location must have
+REQUIRED_COUNTRY_INFO = ("city", "region", "country")
+#fields a "visa" must have, if the record includes one
+REQUIRED_VISA_INFO = ("date", "code")
+
+
+class EntryRecord(object):
+    """
+    compact form of an entry record that has passed parse_entry, holding
+        only what the rules read: upper-cased names and entry reason, the
+        passport number, interned country codes, and dates as day ordinals
+    with __slots__ and shared strings a record takes under a quarter of the
+        memory of the nested dictionaries it comes from; the rule functions
+        and decide_entry accept one in place of the dictionary
+    via_country, visa_day and visa_code are None when the record has no
+        "via" or "visa" information
+    """
+
+    __slots__ = ("first_name", "last_name", "passport", "entry_reason",
+                 "birth_day", "home_country", "from_country", "via_country",
+                 "visa_day", "visa_code")
+
+    def __init__(self, first_name, last_name, passport, entry_reason,
+                 birth_day, home_country, from_country, via_country=None,
+                 visa_day=None, visa_code=None):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.passport = passport
+        self.entry_reason = entry_reason
+        self.birth_day = birth_day
+        self.home_country = home_country
+        self.from_country = from_country
+        self.via_country = via_country
+        self.visa_day = visa_day
+        self.visa_code = visa_code
+
+    @property
+    def birth_date(self):
+        return date.fromordinal(self.birth_day)
+
+    @property
+    def visa_date(self):
+        if self.visa_day is None:
+            return None
+        return date.fromordinal(self.visa_day)
+
+
+def compact_entry(entry_record):
+    """
+    converts an entry record to an EntryRecord for keeping in memory
+    :param entry_record: the traveller's entry record information
+    :return: EntryRecord, or entry_record itself if it is incomplete or
+        badly formatted, since then its decision and reason depend on
+        exactly which fields it lacks
+    """
+
+    record = parse_entry(entry_record)
+    if record is None:
+        return entry_record
+    return record
+
+
+def validate_entry(entry_record, reference_date=None):
+    """
+    checks an entry record in one pass and converts it to an EntryRecord
+    a record is valid when all the required info is present and not blank,
+        "home", "from" and any "via" have a city, region and country, any
+        "visa" has a date and code, the dates are valid and the passport
+        number is correctly formatted
+    :param entry_record: the traveller's entry record information, or an
+        EntryRecord, of which only the dates are checked
+    :param reference_date: datetime.date that dates are checked against;
+        defaults to today
+    :return: EntryRecord, or None if the record is not valid
+    """
+
+    if reference_date is None:
+        reference_date = date.today()
+
+    if isinstance(entry_record, EntryRecord):
+        record = entry_record
+    else:
+        record = parse_entry(entry_record)
+        if record is None:
+            return None
+    #check the birth and visa dates are neither in the future nor too old
+    oldest_day, newest_day = _day_range(reference_date)
+    if not oldest_day <= record.birth_day <= newest_day:
+        return None
+    if record.visa_day is not None \
+            and not oldest_day <= record.visa_day <= newest_day:
+        return None
+    return record
+
+
+def parse_entry(entry_record):
+    """
+    checks everything validate_entry does except the range of the dates,
+        which depends on the reference date
+    :param entry_record: the traveller's entry record information
+    :return: EntryRecord, or None if the record is incomplete or badly
+        formatted
+    """
 
     #check every item in the required info list is in the record entry
-    for item in required_info:
-        if not item in entry_record.keys():
-            return False
-        elif entry_record[item] == "":
-            return False
-        #check if information for "home" and "from" is complete
-        if item == "home" or item == "from":
-            for sub_item in required_country_info:
-                if not sub_item in entry_record[item].keys():
-                    return False
-                elif entry_record[item][sub_item] == "":
-                    return False
+    for item in REQUIRED_INFO:
+        if entry_record.get(item, "") == "":
+            return None
+
+    #check if the traveller's "home" and "from" information is complete
+    home_country = _location_country(entry_record.get("home", ""))
+    from_country = _location_country(entry_record.get("from", ""))
+    if home_country is None or from_country is None:
+        return None
 
     #checks for "via" information if this information is included
-    if "via" in entry_record.keys():
-        #check every "via" item in required info list is in the record entry
-        for via_item in required_country_info:
-            if not via_item in entry_record["via"].keys():
-                return False
-            elif entry_record["via"][via_item] == "":
-                return False
+    via_country = None
+    if "via" in entry_record:
+        via_country = _location_country(entry_record["via"])
+        if via_country is None:
+            return None
 
     #check for "visa" information if this information is included
-    if "visa" in entry_record.keys():
-        #check every "visa" item in required info list is in the record entry
-        for visa_item in required_visa_info:
-            if not visa_item in entry_record["visa"].keys():
-                return False
-            elif entry_record["visa"][visa_item] == "":
-                return False
-
-    #check if the traveller's "home" information is complete
-    if not "country" in entry_record["home"].keys() \
-            or not "city" in entry_record["home"].keys() \
-            or not "region" in entry_record["home"].keys():
-        return False
-    #check if the traveller's "from" information is complete
-    elif not "country" in entry_record["from"].keys() \
-            or not "city" in entry_record["from"].keys() \
-            or not "region" in entry_record["from"].keys():
-        return False
-    #check if traveller's birth date format is correct
-    elif not valid_date_format(entry_record["birth_date"]):
-        return False
-    #check if format of traveller's passport is correct
-    elif not valid_passport_format(entry_record["passport"]):
-        return False
-    #if traveller has a visa, check if visa date format is complete
-    elif "visa" in entry_record.keys():
-        if not valid_date_format(entry_record["visa"]["date"]):
-            return False
-    return True
+    visa_day = None
+    visa_code = None
+    if "visa" in entry_record:
+        visa = entry_record["visa"]
+        for visa_item in REQUIRED_VISA_INFO:
+            if visa.get(visa_item, "") == "":
+                return None
+        visa_date = parse_date(visa["date"])
+        if visa_date is None:
+            return None
+        visa_day = visa_date.toordinal()
+        visa_code = visa["code"]
+
+    #check if traveller's birth date and passport formats are correct
+    birth_date = parse_date(entry_record["birth_date"])
+    if birth_date is None:
+        return None
+    if not PASSPORT_FORMAT.match(entry_record["passport"]):
+        return None
+
+    return EntryRecord(entry_record["first_name"].upper(),
+                       entry_record["last_name"].upper(),
+                       entry_record["passport"],
+                       sys.intern(entry_record["entry_reason"].upper()),
+                       birth_date.toordinal(), home_country, from_country,
+                       via_country, visa_day, visa_code)
+
+
+def _location_country(location):
+    """
+    checks a "home", "from" or "via" location for a city, region and country
+    :param location: location dictionary, or "" if the record has none
+    :return: upper-cased and interned country code, or None if the location
+        is incomplete
+    """
+
+    if location == "":
+        return None
+    for sub_item in REQUIRED_COUNTRY_INFO:
+        if location.get(sub_item, "") == "":
+            return None
+    return sys.intern(location["country"].upper())
+
+
+def _checked_date(date_string, reference_date):
+    """
+    parses a date and checks its range, as valid_date_format does
+    :param date_string: date to be checked
+    :param reference_date: datetime.date that the range is checked against
+    :return: datetime.date, or None if the date is not valid
+    """
+
+    parsed_date = parse_date(date_string)
+    if parsed_date is None or not _date_in_range(parsed_date, reference_date):
+        return None
+    return parsed_date
+
+
+def _date_in_range(checked_date, reference_date):
+    """
+    checks a date is not after the reference date nor more than 150 years
+        before it
+    :param checked_date: datetime.date to be checked
+    :param reference_date: datetime.date that the range is checked against
+    :return: Boolean; True if the date is in range, False otherwise
+    """
+
+    return checked_date <= reference_date \
+        and checked_date.year >= reference_date.year - 150
+
+
+@functools.lru_cache(maxsize=64)
+def _day_range(reference_date):
+    """
+    :param reference_date: datetime.date that the range is checked against
+    :return: tuple of the first and last day ordinals _date_in_range allows
+    """
+
+    return (datetime.date(reference_date.year - 150, 1, 1).toordinal(),
+            reference_date.toordinal())
+
+
+#five sets of five characters separated by dashes
+PASSPORT_FORMAT = re.compile('^.{5}-.{5}-.{5}-.{5}-.{5}$')
 
 
 def valid_passport_format(passport_number):
@@ -254,29 +1141,142 @@ def valid_passport_format(passport_number):
     :return: Boolean; True if the format is valid, False otherwise
     """
 
-    passport_format = re.compile('^.{5}-.{5}-.{5}-.{5}-.{5}$')
-    if passport_format.match(passport_number):
+    if PASSPORT_FORMAT.match(passport_number):
         return True
     else:
         return False
 
 
-def valid_date_format(date_string):
+def valid_date_format(date_string, reference_date=None):
     """
     checks whether a date has the format YYYY-mm-dd in numbers
     checks whether the date range is valid (i.e., no future dated dates,
         birth date within 150 years)
     :param date_string: date to be checked
+    :param reference_date: datetime.date that the range is checked against;
+        defaults to today
     :return: Boolean True if the format is valid, True if date range
         is valid, False otherwise
     """
 
+    if reference_date is None:
+        reference_date = date.today()
+
+    return _checked_date(date_string, reference_date) is not None
+
+
+@functools.lru_cache(maxsize=65536)
+def parse_date(date_string):
+    """
+    converts a YYYY-mm-dd date string to a date
+    the fixed ten character form is split by position; anything else falls
+        back to strptime, so the same strings are accepted as before
+    results are cached, since birth and visa dates repeat across travellers
+    :param date_string: date to be converted
+    :return: datetime.date, or None if the string is not a valid date
+    """
+
+    if len(date_string) == 10 and date_string[4] == "-" \
+            and date_string[7] == "-":
+        year, month, day = date_string[:4], date_string[5:7], date_string[8:]
+        if year.isdigit() and month.isdigit() and day.isdigit():
+            try:
+                return datetime.date(int(year), int(month), int(day))
+            except ValueError:
+                return None
+
     try:
-        time = datetime.datetime.strptime(date_string, '%Y-%m-%d')
-        if datetime.date(time.year, time.month, time.day) > date.today():
-            return False
-        if time.year < (date.today().year - 150):
-            return False
-        return True
+        return datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
     except ValueError:
-        return False
+        return None
+
+
+@functools.lru_cache(maxsize=64)
+def years_before(reference_date, years):
+    """
+    computes the same calendar day a number of years earlier
+    :param reference_date: datetime.date to count back from
+    :param years: number of years
+    :return: datetime.date; February 29 becomes February 28 in a year
+        that is not a leap year
+    """
+
+    try:
+        return reference_date.replace(year=reference_date.year - years)
+    except ValueError:
+        return reference_date.replace(year=reference_date.year - years,
+                                      day=28)
+
+
+def main(arguments=None):
+    """
+    runs the command line: "python -m papers decide ENTRIES..." prints the
+        decisions of each entries file as a JSON array on its own line, and
+        "python -m papers snapshot SNAPSHOT" preloads the reference data
+    only what a run needs is imported; with --snapshot the compiled
+        watchlist and countries are read from one file, which is written on
+        first use and rewritten whenever either reference file changes
+    :param arguments: list of command line arguments; defaults to sys.argv
+    :return: int exit status
+    """
+
+    #argparse is only imported to parse a command line
+    import argparse
+    parser = argparse.ArgumentParser(prog="python -m papers",
+                                     description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    decide_parser = commands.add_parser("decide", help="decide entry files")
+    decide_parser.add_argument("entries_files", nargs="+")
+    decide_parser.add_argument("--snapshot",
+                               help="file of preloaded reference data, "
+                                    "created when missing or out of date")
+    decide_parser.add_argument("--reference-date",
+                               help="YYYY-mm-dd date that dates are "
+                                    "checked against; defaults to today")
+    decide_parser.add_argument("--workers", type=int, default=1)
+    snapshot_parser = commands.add_parser(
+        "snapshot", help="preload the reference data into a snapshot file")
+    snapshot_parser.add_argument("snapshot")
+    for command_parser in [decide_parser, snapshot_parser]:
+        command_parser.add_argument("--watchlist",
+                                    help="defaults to watchlist.json next "
+                                         "to papers.py")
+        command_parser.add_argument("--countries",
+                                    help="defaults to countries.json next "
+                                         "to papers.py")
+    options = parser.parse_args(arguments)
+
+    reference_date = None
+    if getattr(options, "reference_date", None):
+        reference_date = parse_date(options.reference_date)
+        if reference_date is None:
+            decide_parser.error("--reference-date must be a YYYY-mm-dd date")
+
+    #names given on the command line are relative to the current folder
+    watchlist_file = os.path.abspath(options.watchlist) \
+        if options.watchlist else "watchlist.json"
+    countries_file = os.path.abspath(options.countries) \
+        if options.countries else "countries.json"
+    try:
+        if options.snapshot:
+            watchlist_file, countries_file = loader.load_snapshot(
+                os.path.abspath(options.snapshot),
+                [(watchlist_file, WatchlistIndex),
+                 (countries_file, CountryTable)])
+        if options.command == "snapshot":
+            return 0
+        for input_file in options.entries_files:
+            sys.stdout.write(json.dumps(decide(
+                os.path.abspath(input_file), watchlist_file, countries_file,
+                options.workers, reference_date)) + "\n")
+            sys.stdout.flush()
+    except FileNotFoundError as error:
+        sys.exit("no such file: {0}".format(error.filename))
+    return 0
+
+
+if __name__ == "__main__":
+    #run the imported module, so that pickled reference data names its
+    #classes papers.CountryTable and not __main__.CountryTable
+    import papers
+    sys.exit(papers.main())
@@ -0,0 +1,285 @@
+""" Cost-based ordering of the reject checks, with the precedence of decide """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import collections
+import time
+from datetime import date
+from papers import CountryTable
+from papers import decide_entry
+from papers import is_quarantine
+from papers import parse_date
+from papers import PASSPORT_FORMAT
+from papers import REQUIRED_COUNTRY_INFO
+from papers import REQUIRED_INFO
+from papers import REQUIRED_VISA_INFO
+from papers import TRANSIT_VISA_REQUIRED
+from papers import valid_date_format
+from papers import VISITOR_VISA_REQUIRED
+from papers import WatchlistIndex
+from papers import years_before
+
+
+class RulePlan(object):
+    """
+    decides entry records with the precedence of papers.decide_entry, but
+        splits the reject rule into independent checks that are tried in
+        the cheapest order for the traffic seen
+    a record is rejected when any of the checks in REJECT_CHECKS finds a
+        reason to, so they can run in any order and the first that finds
+        one settles the record; when none does, the record is valid and
+        only the watchlist is left
+    records are always checked for quarantine first, as it overrides a
+        rejection; records holding values that are not strings or
+        dictionaries where the rules expect them are decided by
+        decide_entry, so they fail or succeed exactly as before
+    profile measures each check's cost and how often it rejects, and
+        optimize orders the checks by cost per rejection
+    """
+
+    def __init__(self, order=None):
+        """
+        :param order: list of the names in REJECT_CHECKS, in the order to
+            try them; defaults to the order of REJECT_CHECKS
+        """
+
+        self.order = list(REJECT_CHECKS) if order is None else list(order)
+        if sorted(self.order) != sorted(REJECT_CHECKS):
+            raise ValueError("a plan must order every check exactly once")
+        self._checks = [REJECT_CHECKS[name] for name in self.order]
+        self.profile_report = None
+
+    def decide(self, entry_record, watch_list, countries, reference_date):
+        """
+        decides whether one traveller's entry into Kanadia should be accepted
+        :param entry_record: the traveller's entry record information
+        :param watch_list: a WatchlistIndex
+        :param countries: a CountryTable
+        :param reference_date: datetime.date that dates are checked against
+        :return: string; "Quarantine", "Reject", "Secondary", or "Accept"
+        """
+
+        if not _plain_record(entry_record):
+            return decide_entry(entry_record, watch_list, countries,
+                                reference_date)
+        if is_quarantine(entry_record, countries):
+            return "Quarantine"
+        for check in self._checks:
+            if check(entry_record, countries, reference_date):
+                return "Reject"
+        if watch_list.matches(entry_record):
+            return "Secondary"
+        return "Accept"
+
+    def decide_entries(self, entries, watch_list, countries,
+                       reference_date=None):
+        """
+        decides a sequence of entry records with this plan
+        :param entries: iterable of entry records
+        :param watch_list: a WatchlistIndex, or the list of watchlist entries
+        :param countries: a CountryTable, or the dictionary of country data
+            keyed by country code
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today, read once for the whole batch
+        :return: iterator of decision strings, in the same order as entries
+        """
+
+        if not isinstance(watch_list, WatchlistIndex):
+            watch_list = WatchlistIndex(watch_list)
+        if not isinstance(countries, CountryTable):
+            countries = CountryTable(countries)
+        if reference_date is None:
+            reference_date = date.today()
+        for entry_record in entries:
+            yield self.decide(entry_record, watch_list, countries,
+                              reference_date)
+
+    def profile(self, entries, countries, reference_date=None):
+        """
+        runs every reject check on every record that reaches them, timing
+            each and counting how often it rejects
+        :param entries: iterable of entry records, such as a sample of a
+            day's traffic
+        :param countries: a CountryTable, or the dictionary of country data
+            keyed by country code
+        :param reference_date: datetime.date that dates are checked against;
+            defaults to today
+        :return: dictionary with "records", the number profiled; "checked",
+            the number that reached the reject checks; and "checks", a
+            dictionary of calls, rejections, seconds, rejection rate and
+            microseconds per rejection for each check
+        """
+
+        if not isinstance(countries, CountryTable):
+            countries = CountryTable(countries)
+        if reference_date is None:
+            reference_date = date.today()
+        clock = time.perf_counter
+        calls = collections.Counter()
+        rejections = collections.Counter()
+        seconds = collections.Counter()
+
+        records = 0
+        for entry_record in entries:
+            records += 1
+            if not _plain_record(entry_record) \
+                    or is_quarantine(entry_record, countries):
+                continue
+            for name, check in REJECT_CHECKS.items():
+                start = clock()
+                rejected = check(entry_record, countries, reference_date)
+                seconds[name] += clock() - start
+                calls[name] += 1
+                rejections[name] += rejected
+
+        checks = {}
+        for name in REJECT_CHECKS:
+            rate = rejections[name] / calls[name] if calls[name] else 0.0
+            cost = seconds[name] / calls[name] if calls[name] else 0.0
+            checks[name] = {"calls": calls[name],
+                            "rejections": rejections[name],
+                            "seconds": seconds[name], "rejection_rate": rate,
+                            "us_per_rejection": cost / rate * 1e6
+                            if rate else None}
+        self.profile_report = {"records": records,
+                               "checked": max(calls.values() or [0]),
+                               "checks": checks}
+        return self.profile_report
+
+    def optimize(self, entries=None, countries=None, reference_date=None):
+        """
+        orders the checks by cost per rejection, cheapest first, which
+            minimizes the expected time spent on records that are rejected;
+            checks that never rejected go last, cheapest first
+        :param entries: iterable of entry records to profile, or None to use
+            the last profile
+        :param countries: a CountryTable, or the dictionary of country data;
+            needed when entries is given
+        :param reference_date: datetime.date that dates are checked against
+        :return: RulePlan with the new order
+        """
+
+        if entries is not None:
+            self.profile(entries, countries, reference_date)
+        if self.profile_report is None:
+            raise ValueError("profile a sample of entries first")
+        checks = self.profile_report["checks"]
+
+        def rank(name):
+            per_rejection = checks[name]["us_per_rejection"]
+            cost = checks[name]["seconds"] / (checks[name]["calls"] or 1)
+            return (per_rejection is None, per_rejection or cost)
+
+        plan = RulePlan(sorted(REJECT_CHECKS, key=rank))
+        plan.profile_report = self.profile_report
+        return plan
+
+    def report(self):
+        """
+        :return: dictionary of the plan's order and its last profile, ready
+            to be saved as JSON
+        """
+
+        return {"order": list(self.order), "profile": self.profile_report}
+
+
+def _plain_record(entry_record):
+    """
+    checks that the rules can not fail on a record: every required field,
+        country code and visa date is a string, if it is there at all, and
+        every location and visa is a dictionary
+    :param entry_record: the traveller's entry record information
+    :return: Boolean; True if the reject checks may decide the record
+    """
+
+    if entry_record.__class__ is not dict:
+        return False
+    get = entry_record.get
+    for item in REQUIRED_INFO:
+        if get(item, "").__class__ is not str:
+            return False
+    if "home" not in entry_record or "from" not in entry_record:
+        return False
+    for location in ("home", "from", "via"):
+        if location in entry_record:
+            place = entry_record[location]
+            if place.__class__ is not dict \
+                    or place.get("country", "").__class__ is not str:
+                return False
+    if "visa" in entry_record:
+        visa = entry_record["visa"]
+        if visa.__class__ is not dict \
+                or visa.get("date", "").__class__ is not str:
+            return False
+    return True
+
+
+def _missing_field(entry_record, countries, reference_date):
+    #a required field, location detail or visa detail is missing or blank
+    get = entry_record.get
+    for item in REQUIRED_INFO:
+        if get(item, "") == "":
+            return True
+    for location in ("home", "from", "via"):
+        if location in entry_record:
+            place = entry_record[location]
+            for sub_item in REQUIRED_COUNTRY_INFO:
+                if place.get(sub_item, "") == "":
+                    return True
+    if "visa" in entry_record:
+        for visa_item in REQUIRED_VISA_INFO:
+            if entry_record["visa"].get(visa_item, "") == "":
+                return True
+    return False
+
+
+def _bad_date(entry_record, countries, reference_date):
+    #the birth or visa date is not a date, is in the future or is too old
+    if not valid_date_format(entry_record.get("birth_date", ""),
+                             reference_date):
+        return True
+    return "visa" in entry_record and not valid_date_format(
+        entry_record["visa"].get("date", ""), reference_date)
+
+
+def _bad_passport(entry_record, countries, reference_date):
+    return not PASSPORT_FORMAT.match(entry_record.get("passport", ""))
+
+
+def _unknown_country(entry_record, countries, reference_date):
+    return countries.flags(entry_record["from"].get("country", "")) is None
+
+
+def _missing_visa(entry_record, countries, reference_date):
+    #a visitor or traveller in transit needs a visa and has no current one;
+    #an unknown country is a rejection too
+    from_flags = countries.flags(entry_record["from"].get("country", ""))
+    if from_flags is None:
+        return True
+    entry_reason = entry_record.get("entry_reason", "").upper()
+    if not (entry_reason == "TRANSIT" and from_flags & TRANSIT_VISA_REQUIRED
+            or entry_reason == "VISIT"
+            and from_flags & VISITOR_VISA_REQUIRED):
+        return False
+    if "visa" not in entry_record:
+        return True
+    visa_date = parse_date(entry_record["visa"].get("date", ""))
+    return visa_date is None \
+        or not visa_date > years_before(reference_date, 2)
+
+
+#every reason a plain record is rejected for; each check only says True
+#for records papers.decide_entry rejects, unless they are quarantined
+REJECT_CHECKS = collections.OrderedDict([
+    ("missing_field", _missing_field),
+    ("bad_date", _bad_date),
+    ("bad_passport", _bad_passport),
+    ("unknown_country", _unknown_country),
+    ("missing_visa", _missing_visa)])
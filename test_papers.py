@@ -9,8 +9,52 @@ __license__ = "MIT License"
 __status__ = "v8"
 
 # imports one per line
+import asyncio
+import http.client
+import io
+import json
+import os
+import pickle
 import pytest
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from datetime import date
+import columnar
+import loader
+from async_office import AsyncBorderOffice
+from batch_driver import decide_sharded
+from batch_driver import read_manifest
+from decision_cache import DecisionCache
+import entry_store
+from border_office import BorderOffice
+from border_office import make_server
+from fuzzy_watchlist import FuzzyWatchlistIndex
+from fuzzy_watchlist import soundex
+from incremental import IncrementalDecider
+from rule_plan import RulePlan
+from traffic import generate_entries
+from traffic import write_entries
+from papers import compact_entry
+from papers import CountryTable
 from papers import decide
+from papers import decide_entries
+from papers import decide_iter
+from papers import DecisionStats
+from papers import is_quarantine
+from papers import is_reject
+from papers import is_secondary
+from papers import is_valid_visa
+from papers import iter_json_array
+from papers import iter_jsonl
+from papers import main
+from papers import parse_date
+from papers import reject_reason
+from papers import valid_date_format
+from papers import validate_entry
+from papers import WatchlistIndex
 
 
 def test_basic():
@@ -109,17 +153,26 @@ def test_secondary():
     Included cases: whether traveller is in transit or visiting with valid or
     invalid visa, or in transit or visiting from a country with no visa needed.
     """
+    #the fixtures' visas date from 2012 and 2013, when the assignment was
+    #written; against today's date they have expired, so the assignment's
+    #date is used
+    reference_date = date(2014, 11, 1)
     assert decide("test_JSON_files/test_27.json",
-                  "watchlist.json", "countries.json") == ["Secondary"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Secondary"]
     assert decide("test_JSON_files/test_31.json",
-                  "watchlist.json", "countries.json") == ["Reject"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Reject"]
 
     assert decide("test_JSON_files/test_33.json",
-                  "watchlist.json", "countries.json") == ["Secondary"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Secondary"]
     assert decide("test_JSON_files/test_35.json",
-                  "watchlist.json", "countries.json") == ["Secondary"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Secondary"]
     assert decide("test_JSON_files/test_37.json",
-                  "watchlist.json", "countries.json") == ["Secondary"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Secondary"]
 
 
 def test_accept():
@@ -133,22 +186,33 @@ def test_accept():
 
     Also includes tests of fields with both upper and lower case values.
     """
+    #the fixtures' visas date from 2012 and 2013, when the assignment was
+    #written; against today's date they have expired, so the assignment's
+    #date is used
+    reference_date = date(2014, 11, 1)
     assert decide("test_JSON_files/test_28.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
     assert decide("test_JSON_files/test_32.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
     assert decide("test_JSON_files/test_34.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
 
     assert decide("test_JSON_files/test_38.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
     assert decide("test_JSON_files/test_39.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
 
     assert decide("test_JSON_files/test_lower_case.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
     assert decide("test_JSON_files/test_upper_case.json",
-                  "watchlist.json", "countries.json") == ["Accept"]
+                  "watchlist.json", "countries.json",
+                  reference_date=reference_date) == ["Accept"]
 
 
 def test_reject():
@@ -237,3 +301,837 @@ def test_files():
     """
     with pytest.raises(FileNotFoundError):
         decide("test_returning_citizen.json", "", "countries.json")
+
+
+def test_watchlist_index():
+    """
+    Tests the watchlist index: names match regardless of case, passports
+    match exactly, and blank watchlist fields never match a traveller.
+    """
+    index = WatchlistIndex([
+        {"first_name": "", "last_name": "",
+         "passport": "ZL59X-ZRSTX-JK2QN-Z0IN2-VRB3Q"},
+        {"first_name": "PATRIA", "last_name": "OGLESBY", "passport": ""}])
+    assert is_secondary({"first_name": "patria", "last_name": "Oglesby",
+                         "passport": "AAAAA-AAAAA-AAAAA-AAAAA-AAAAA"}, index)
+    assert is_secondary({"first_name": "JOHN", "last_name": "SMITH",
+                         "passport": "ZL59X-ZRSTX-JK2QN-Z0IN2-VRB3Q"}, index)
+    assert not is_secondary({"first_name": "", "last_name": "",
+                             "passport": ""}, index)
+    assert not is_secondary({"first_name": "PATRIA", "last_name": "SMITH",
+                             "passport": "AAAAA-AAAAA-AAAAA-AAAAA-AAAAA"},
+                            index)
+    assert is_secondary({"first_name": "PATRIA", "last_name": "OGLESBY",
+                         "passport": ""},
+                        [{"first_name": "patria", "last_name": "oglesby",
+                          "passport": ""}])
+
+
+def test_iter_json_array():
+    """
+    Tests that entries read incrementally, even a few characters at a time,
+    are the same as the entries loaded with json.load.
+    """
+    with open("test_JSON_files/test_missing_keys.json") as json_file:
+        text = json_file.read()
+    for chunk_size in [1, 7, 65536]:
+        assert list(iter_json_array(io.StringIO(text), chunk_size)) \
+            == json.loads(text)
+    assert list(iter_json_array(io.StringIO(" [ ] "))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("[{}, {}")))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("{}")))
+
+    #a malformed item fails where it is, without reading the rest of the file
+    class CountingFile(io.StringIO):
+        reads = 0
+
+        def read(self, size=-1):
+            self.reads += 1
+            return io.StringIO.read(self, size)
+
+    counting_file = CountingFile("[{}, {\"a\": 1 x}, " + "{}, " * 100000
+                                 + "{}]")
+    with pytest.raises(ValueError):
+        list(iter_json_array(counting_file, 64))
+    assert counting_file.reads <= 2
+
+
+def test_decide_workers():
+    """
+    Tests that entries decided on a process pool come back in the same
+    order, with the same decisions, as entries decided in one process.
+    """
+    with open("countries.json") as countries_file, \
+            open("watchlist.json") as watchlist_file:
+        countries = json.load(countries_file)
+        watch_list = json.load(watchlist_file)
+    entries = []
+    for file_name in ["test_watchlist.json", "test_quarantine.json",
+                      "test_JSON_files/test_missing_keys.json",
+                      "test_returning_citizen.json"]:
+        with open(file_name) as json_file:
+            entries += json.load(json_file)
+    serial = list(decide_entries(entries, watch_list, countries))
+    assert list(decide_entries(entries, watch_list, countries, workers=2,
+                               chunk_size=3)) == serial
+
+
+def test_border_office_reload(tmp_path):
+    """
+    Tests that a border office decides with its loaded reference data,
+    picks up a changed watchlist file on the next decision, keeps its data
+    while the file is broken, and answers every HTTP request.
+    """
+    countries_file = str(tmp_path / "countries.json")
+    watchlist_file = str(tmp_path / "watchlist.json")
+    with open("countries.json") as json_file:
+        countries_text = json_file.read()
+    with open(countries_file, "w") as json_file:
+        json_file.write(countries_text)
+    with open(watchlist_file, "w") as json_file:
+        json.dump([], json_file)
+    with open("test_returning_citizen.json") as json_file:
+        citizen = json.load(json_file)[0]
+
+    office = BorderOffice(watchlist_file, countries_file)
+    assert office.decide_record(citizen) == "Accept"
+    assert not office.reload_if_changed()
+
+    with open(watchlist_file, "w") as json_file:
+        json.dump([{"first_name": citizen["first_name"],
+                    "last_name": citizen["last_name"], "passport": ""}],
+                  json_file)
+    stat = os.stat(watchlist_file)
+    os.utime(watchlist_file, ns=(stat.st_atime_ns,
+                                 stat.st_mtime_ns + 10 ** 9))
+    assert office.decide_record(citizen) == "Secondary"
+    assert office.decide_batch([citizen, citizen]) == ["Secondary",
+                                                       "Secondary"]
+
+    #a half written file keeps the loaded data until it is complete
+    with open(watchlist_file, "w") as json_file:
+        json_file.write('[{"first_name": ')
+    os.utime(watchlist_file, ns=(stat.st_atime_ns,
+                                 stat.st_mtime_ns + 2 * 10 ** 9))
+    assert office.decide_record(citizen) == "Secondary"
+    assert office.reload_errors == 1
+    assert isinstance(office.last_reload_error, ValueError)
+    os.remove(watchlist_file)
+    assert office.decide_record(citizen) == "Secondary"
+    assert office.reload_errors == 2
+    with open(watchlist_file, "w") as json_file:
+        json.dump([], json_file)
+    assert office.decide_record(citizen) == "Accept"
+    assert office.last_reload_error is None
+
+    #every request gets an answer, with a JSON error body on failure
+    server = make_server(office, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = "http://127.0.0.1:{0}/".format(server.server_address[1])
+        for body, status in [(citizen, 200), ([citizen], 200), (5, 400),
+                             ([citizen, "x"], 400),
+                             (dict(citizen, home=5), 400)]:
+            try:
+                response = urllib.request.urlopen(
+                    url, json.dumps(body).encode("utf-8"))
+            except urllib.error.HTTPError as error:
+                response = error
+            assert response.status == status
+            answer = json.loads(response.read().decode("utf-8"))
+            assert answer in ["Accept", ["Accept"]] if status == 200 \
+                else "error" in answer
+
+        #a missing or unreadable Content-Length is answered too
+        for length in [None, "abc", "-1"]:
+            connection = http.client.HTTPConnection(
+                "127.0.0.1", server.server_address[1])
+            connection.putrequest("POST", "/")
+            if length is not None:
+                connection.putheader("Content-Length", length)
+            connection.endheaders()
+            response = connection.getresponse()
+            assert response.status == 400
+            assert "error" in json.loads(response.read().decode("utf-8"))
+            connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_country_table():
+    """
+    Tests the compiled country table: codes are looked up in any case,
+    KAN is always known, and the quarantine and reject checks give the
+    same answers with the table as with the countries dictionary.
+    """
+    with open("countries.json") as countries_file:
+        countries = json.load(countries_file)
+    table = CountryTable(countries)
+    assert "kan" in table and "gor" in table and "ZZZ" not in table
+    assert table.flags("KAN") == 0
+    assert table.flags("ZZZ") is None
+
+    with open("test_quarantine.json") as json_file:
+        traveller = json.load(json_file)[0]
+    assert is_quarantine(traveller, table)
+    assert is_quarantine(traveller, countries)
+
+    with open("test_returning_citizen.json") as json_file:
+        citizen = json.load(json_file)[0]
+    citizen["from"]["country"] = "kan"
+    citizen["entry_reason"] = "transit"
+    assert not is_reject(citizen, table)
+    citizen["from"]["country"] = "ZZZ"
+    assert is_reject(citizen, table)
+
+
+def test_reference_date():
+    """
+    Tests date checks against a fixed reference date: future dates and
+    dates more than 150 years back are invalid, visas expire after 2 years,
+    and a February 29 reference date does not break the visa check.
+    """
+    assert parse_date("2014-11-01") == date(2014, 11, 1)
+    assert parse_date("2014-1-5") == date(2014, 1, 5)
+    assert parse_date("2014-02-30") is None
+    assert parse_date("20141101") is None
+
+    reference_date = date(2014, 11, 1)
+    assert valid_date_format("2014-11-01", reference_date)
+    assert not valid_date_format("2014-11-02", reference_date)
+    assert not valid_date_format("1863-12-31", reference_date)
+
+    visa = {"visa": {"date": "2012-11-02", "code": "CFR6X-XSMV1"}}
+    assert is_valid_visa(visa, reference_date)
+    assert not is_valid_visa(visa, date(2014, 11, 2))
+    assert is_valid_visa({"visa": {"date": "2010-03-01", "code": "X"}},
+                         date(2012, 2, 29))
+    assert not is_valid_visa({}, reference_date)
+
+
+def test_validate_entry():
+    """
+    Tests that a complete record is converted to an EntryRecord with
+    upper-cased codes and parsed dates, and that records with missing keys
+    or values are not, or are rejected for lacking a visa.
+    """
+    with open("countries.json") as countries_file:
+        countries = json.load(countries_file)
+    with open("test_JSON_files/test_lower_case.json") as json_file:
+        traveller = json.load(json_file)[0]
+    record = validate_entry(traveller, date(2014, 11, 1))
+    assert record.from_country == traveller["from"]["country"].upper()
+    assert record.entry_reason == traveller["entry_reason"].upper()
+    assert record.birth_date == parse_date(traveller["birth_date"])
+
+    for file_name in ["test_JSON_files/test_missing_keys.json",
+                      "test_JSON_files/test_missing_values.json",
+                      "test_JSON_files/test_missing_entry_pairs.json"]:
+        with open(file_name) as json_file:
+            for entry in json.load(json_file):
+                record = validate_entry(entry, date(2014, 11, 1))
+                assert record is None or record.visa_date is None
+                assert is_reject(entry, countries, date(2014, 11, 1))
+
+
+def test_columnar_engine(tmp_path):
+    """
+    Tests that the columnar engine, including after saving and loading its
+    columns, gives the same decisions as deciding record by record.
+    """
+    pytest.importorskip("numpy")
+    with open("countries.json") as countries_file, \
+            open("watchlist.json") as watchlist_file:
+        countries = json.load(countries_file)
+        watch_list = json.load(watchlist_file)
+    entries = []
+    for number in range(1, 53):
+        with open("test_JSON_files/test_{0:02d}.json".format(number)) \
+                as json_file:
+            entries += json.load(json_file)
+    for file_name in ["test_JSON_files/test_dates.json",
+                      "test_JSON_files/test_missing_keys.json",
+                      "test_JSON_files/test_lower_case.json",
+                      "test_returning_citizen.json"]:
+        with open(file_name) as json_file:
+            entries += json.load(json_file)
+
+    reference_date = date(2014, 11, 1)
+    rows = list(decide_entries(entries, watch_list, countries,
+                               reference_date=reference_date))
+    assert columnar.decide_entries_columnar(
+        entries, watch_list, countries, reference_date) == rows
+
+    columns_file = str(tmp_path / "entries.npz")
+    columnar.load_columns(entries).save(columns_file)
+    decisions = columnar.decide_columns(
+        columnar.EntryColumns.load(columns_file), watch_list, countries,
+        reference_date)
+    assert [columnar.DECISIONS[decision] for decision in decisions] == rows
+
+
+def test_generated_traffic(tmp_path):
+    """
+    Tests that generated traffic is reproducible for a seed, that its rates
+    show up in the decisions, and that it round-trips through a JSON file.
+    """
+    with open("countries.json") as countries_file, \
+            open("watchlist.json") as watchlist_file:
+        countries = json.load(countries_file)
+        watch_list = json.load(watchlist_file)
+    reference_date = date(2014, 11, 1)
+    entries = list(generate_entries(2000, countries, watch_list, 7,
+                                    reference_date, watchlist_rate=0.2))
+    assert entries == list(generate_entries(2000, countries, watch_list, 7,
+                                            reference_date,
+                                            watchlist_rate=0.2))
+    decisions = list(decide_entries(entries, watch_list, countries,
+                                    reference_date=reference_date))
+    assert 100 < decisions.count("Secondary") < 500
+
+    entries_file = str(tmp_path / "entries.json")
+    assert write_entries(entries_file, entries) == 2000
+    with open(entries_file) as json_file:
+        assert list(iter_json_array(json_file)) == entries
+
+
+def test_decision_stats():
+    """
+    Tests that instrumented decisions are the same as plain ones, that each
+    rule call and outcome is counted, and that every traveller is traced
+    with the reason for their decision.
+    """
+    with open("countries.json") as countries_file, \
+            open("watchlist.json") as watchlist_file:
+        countries = json.load(countries_file)
+        watch_list = json.load(watchlist_file)
+    entries = []
+    for file_name in ["test_quarantine.json", "test_watchlist.json",
+                      "test_returning_citizen.json",
+                      "test_JSON_files/test_dates.json",
+                      "test_JSON_files/test_invalid_country.json",
+                      "test_JSON_files/test_missing_keys.json"]:
+        with open(file_name) as json_file:
+            entries += json.load(json_file)
+    reference_date = date(2014, 11, 1)
+
+    stats = DecisionStats()
+    traced = []
+    decisions = list(decide_entries(
+        entries, watch_list, countries, reference_date=reference_date,
+        stats=stats, trace=lambda entry, decision, reason:
+        traced.append((decision, reason))))
+    assert decisions == list(decide_entries(entries, watch_list, countries,
+                                            reference_date=reference_date))
+    assert [decision for decision, reason in traced] == decisions
+    assert traced[:4] == [("Quarantine", "medical advisory"),
+                          ("Secondary", "watchlist"),
+                          ("Accept", None), ("Accept", None)]
+    assert set(traced[4:10]) == set([("Reject", "bad date"),
+                                     ("Reject", "expired visa")])
+    assert traced[10] == ("Reject", "unknown country")
+    assert stats.rule_calls["is_quarantine"] == len(entries)
+    assert sum(stats.decisions.values()) == len(entries)
+    assert stats.reasons["missing field"] + stats.reasons["missing visa"] \
+        == 10
+
+    #one DecisionStats shared by threads, as a BorderOffice's server does,
+    #loses no counts, and a pickled copy counts on its own
+    shared = DecisionStats()
+    threads = [threading.Thread(target=lambda: list(decide_entries(
+        entries * 20, watch_list, countries, reference_date=reference_date,
+        stats=shared))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(shared.decisions.values()) == 80 * len(entries)
+    assert shared.rule_calls["is_quarantine"] == 80 * len(entries)
+    copied = pickle.loads(pickle.dumps(shared))
+    copied.add_decision("Accept", None)
+    assert copied.report()["decisions"]["Accept"] \
+        == shared.decisions["Accept"] + 1
+
+
+def test_fuzzy_watchlist():
+    """
+    Tests that the fuzzy watchlist catches spelling variants of listed names
+    and passports that the exact index lets through, and still never
+    matches on blank fields.
+    """
+    with open("watchlist.json") as watchlist_file:
+        watch_list = json.load(watchlist_file)
+    exact = WatchlistIndex(watch_list)
+    fuzzy = FuzzyWatchlistIndex(watch_list)
+    assert soundex("OGLESBY") == soundex("OGLESBEE") == "O242"
+
+    variant = {"first_name": "Patria", "last_name": "Oglesbee",
+               "passport": "AAAAA-AAAAA-AAAAA-AAAAA-AAAAA"}
+    assert not is_secondary(variant, exact)
+    assert is_secondary(variant, fuzzy)
+    assert fuzzy.best_match(variant)[1] == "PATRIA OGLESBY"
+
+    typo = {"first_name": "JOHN", "last_name": "SMITH",
+            "passport": "ZL59X-ZRSTX-JK2QN-Z0IN2-VRB3O"}
+    assert not is_secondary(typo, exact)
+    assert is_secondary(typo, fuzzy)
+
+    assert not is_secondary({"first_name": "JOHN", "last_name": "SMITH",
+                             "passport": "AAAAA-AAAAA-AAAAA-AAAAA-AAAAA"},
+                            fuzzy)
+    assert not is_secondary({"first_name": "", "last_name": "",
+                             "passport": ""}, fuzzy)
+    assert not is_secondary(variant, FuzzyWatchlistIndex(watch_list,
+                                                         threshold=0.95,
+                                                         phonetic_threshold=1))
+
+    #a name or passport listed many times is only indexed once
+    repeated = FuzzyWatchlistIndex(watch_list * 50)
+    assert repeated.best_match(variant) == fuzzy.best_match(variant)
+    assert len(repeated._names.strings) == len(fuzzy._names.strings)
+    assert len(repeated._passports.strings) == len(fuzzy._passports.strings)
+
+
+def test_incremental_decider():
+    """
+    Tests that after the countries or the watchlist change, re-deciding only
+    the affected entries gives the same decisions as deciding them all
+    again, and that only the changed decisions are reported.
+    """
+    with open("countries.json") as countries_file, \
+            open("watchlist.json") as watchlist_file:
+        countries = json.load(countries_file)
+        watch_list = json.load(watchlist_file)
+    reference_date = date(2014, 11, 1)
+    entries = list(generate_entries(3000, countries, watch_list, 11,
+                                    reference_date))
+    decider = IncrementalDecider(watch_list, countries, reference_date)
+    assert decider.add(entries) == list(decide_entries(
+        entries, watch_list, countries, reference_date=reference_date))
+
+    new_countries = json.loads(json.dumps(countries))
+    new_countries["ALB"]["medical_advisory"] = "FLU"
+    new_countries["BRD"]["visitor_visa_required"] = "0"
+    new_watch_list = watch_list[1:] + [
+        {"first_name": entries[0]["first_name"],
+         "last_name": entries[0]["last_name"], "passport": ""}]
+    before = list(decider.decisions)
+    changes = decider.update(new_watch_list, new_countries)
+
+    after = list(decide_entries(entries, new_watch_list, new_countries,
+                                reference_date=reference_date))
+    assert decider.decisions == after
+    assert changes == [(position, before[position], after[position])
+                       for position in range(len(entries))
+                       if before[position] != after[position]]
+    assert changes
+    assert decider.update(new_watch_list, new_countries) == []
+
+
+def test_loader_cache(tmp_path):
+    """
+    Tests that reference data is compiled once, cached on disk by content,
+    and rebuilt when the file changes, and that missing files are reported.
+    """
+    countries_file = str(tmp_path / "countries.json")
+    with open("countries.json") as json_file:
+        countries = json.load(json_file)
+    with open(countries_file, "w") as json_file:
+        json.dump(countries, json_file)
+
+    table = loader.load_compiled(countries_file, CountryTable)
+    assert loader.load_compiled(countries_file, CountryTable) is table
+    assert len(os.listdir(str(tmp_path / loader.CACHE_DIR_NAME))) == 1
+
+    #a new process would find the pickled copy
+    loader.clear_loaded()
+    cached = loader.load_compiled(countries_file, CountryTable)
+    assert cached is not table
+    assert not cached.changed_codes(table)
+
+    countries["JIK"]["medical_advisory"] = "EBOLA"
+    with open(countries_file, "w") as json_file:
+        json.dump(countries, json_file)
+    stat = os.stat(countries_file)
+    os.utime(countries_file, ns=(stat.st_atime_ns,
+                                 stat.st_mtime_ns + 10 ** 9))
+    changed = loader.load_compiled(countries_file, CountryTable)
+    assert changed.changed_codes(table) == {"JIK"}
+    #only the latest version is kept, in memory and on disk
+    assert len(os.listdir(str(tmp_path / loader.CACHE_DIR_NAME))) == 1
+    assert [key for key in loader._loaded
+            if key[0] == countries_file] == [
+        (countries_file, "papers.CountryTable")]
+
+    #from_file gives each caller an index of its own to add to
+    watchlist_file = str(tmp_path / "watchlist.json")
+    with open(watchlist_file, "w") as json_file:
+        json.dump([{"first_name": "", "last_name": "",
+                    "passport": "AAAAA-AAAAA-AAAAA-AAAAA-AAAAA"}], json_file)
+    suspect = {"first_name": "", "last_name": "",
+               "passport": "BBBBB-BBBBB-BBBBB-BBBBB-BBBBB"}
+    WatchlistIndex.from_file(watchlist_file).add(suspect)
+    assert not WatchlistIndex.from_file(watchlist_file).matches(suspect)
+    fuzzy = FuzzyWatchlistIndex.from_file(watchlist_file,
+                                          passport_threshold=0.99)
+    fuzzy.add(suspect)
+    assert fuzzy.passport_threshold == 0.99
+    assert not FuzzyWatchlistIndex.from_file(watchlist_file).matches(suspect)
+
+    with pytest.raises(FileNotFoundError):
+        loader.load_compiled(str(tmp_path / "missing.json"), CountryTable)
+    with pytest.raises(FileNotFoundError):
+        loader.resolve_path("")
+
+
+def test_async_office(tmp_path):
+    """
+    Tests that concurrent and streamed submissions are coalesced into
+    batches, decided as decide_entries would, and that reloads are seen.
+    """
+    watchlist_file = str(tmp_path / "watchlist.json")
+    with open(watchlist_file, "w") as json_file:
+        json.dump([], json_file)
+    with open("countries.json") as json_file:
+        countries = json.load(json_file)
+    reference_date = date(2014, 11, 1)
+    entries = list(generate_entries(300, countries, seed=5,
+                                    reference_date=reference_date))
+    expected = list(decide_entries(entries, [], countries,
+                                   reference_date=reference_date))
+
+    async def kiosks():
+        office = await AsyncBorderOffice.create(
+            watchlist_file, "countries.json", reload_interval=None,
+            max_batch=100)
+        async with office:
+            decisions = await asyncio.gather(*[
+                office.decide_record(entry, reference_date)
+                for entry in entries])
+            assert office.batches == 3
+
+            async def stream():
+                for entry in entries:
+                    yield entry
+            streamed = [decision async for decision in
+                        office.decide_stream(stream(), reference_date)]
+
+            with open(watchlist_file, "w") as json_file:
+                json.dump([{"first_name": "", "last_name": "",
+                            "passport": entries[0]["passport"]}], json_file)
+            stat = os.stat(watchlist_file)
+            os.utime(watchlist_file, ns=(stat.st_atime_ns,
+                                         stat.st_mtime_ns + 10 ** 9))
+            assert await office.reload()
+            assert not await office.reload()
+            reloaded = await office.decide_record(entries[0], reference_date)
+        return decisions, streamed, reloaded
+
+    decisions, streamed, reloaded = asyncio.run(kiosks())
+    assert decisions == expected
+    assert streamed == expected
+    assert expected[0] == "Accept"
+    assert reloaded == "Secondary"
+
+    #a watchlist missing for a while, as while it is being replaced, must
+    #not stop the watcher nor the deciding
+    async def missing_file():
+        office = await AsyncBorderOffice.create(
+            watchlist_file, "countries.json", reload_interval=0.01)
+        async with office:
+            os.rename(watchlist_file, watchlist_file + ".new")
+            await asyncio.sleep(0.05)
+            assert not office._watcher.done()
+            during = await office.decide_record(entries[0], reference_date)
+            os.rename(watchlist_file + ".new", watchlist_file)
+            await asyncio.sleep(0.05)
+            assert not office._watcher.done()
+        return during
+
+    assert asyncio.run(missing_file()) == "Secondary"
+
+
+def test_compact_entry():
+    """
+    Tests that compact records share their country codes, store dates as day
+    ordinals, and get the same decisions and reasons as the dictionaries.
+    """
+    with open("countries.json") as json_file:
+        countries = json.load(json_file)
+    with open("watchlist.json") as json_file:
+        watch_list = json.load(json_file)
+    reference_date = date(2014, 11, 1)
+    entries = [json.loads(json.dumps(entry)) for entry in generate_entries(
+        2000, countries, watch_list, seed=11, watchlist_rate=0.1,
+        reference_date=reference_date)]
+    records = [compact_entry(entry) for entry in entries]
+
+    compact = [record for record in records if not isinstance(record, dict)]
+    assert len(compact) > 1800
+    assert not hasattr(compact[0], "__dict__")
+    assert compact[0].birth_day == compact[0].birth_date.toordinal()
+    same_country = [record for record in compact
+                    if record.from_country == compact[0].from_country]
+    assert same_country[1].from_country is compact[0].from_country
+
+    table = CountryTable(countries)
+    for later in [reference_date, date(2016, 11, 1)]:
+        assert list(decide_entries(records, watch_list, table,
+                                   reference_date=later)) == \
+            list(decide_entries(entries, watch_list, table,
+                                reference_date=later))
+        for entry, record in zip(entries, records):
+            assert reject_reason(record, table, later) == \
+                reject_reason(entry, table, later)
+
+    #a visa issued after the reference date is not valid in either form
+    entry = dict(entries[0],
+                 visa={"date": "2015-06-01", "code": "CFR6X-XSMVA"})
+    assert not is_valid_visa(entry, reference_date)
+    assert not isinstance(compact_entry(entry), dict)
+    assert not is_valid_visa(compact_entry(entry), reference_date)
+
+
+def test_batch_driver(tmp_path):
+    """
+    Tests that sharded decisions of several files merge back in order, and
+    that a resumed batch only decides the shards that had not finished.
+    """
+    with open("countries.json") as json_file:
+        countries = json.load(json_file)
+    with open("watchlist.json") as json_file:
+        watch_list = json.load(json_file)
+    reference_date = date(2014, 11, 1)
+    entries = list(generate_entries(1000, countries, watch_list, seed=16,
+                                    reference_date=reference_date))
+    ports = [str(tmp_path / "port_a.json"), str(tmp_path / "port_b.json")]
+    write_entries(ports[0], entries[:450])
+    write_entries(ports[1], entries[450:])
+    expected = list(decide_entries(entries, watch_list, countries,
+                                   reference_date=reference_date))
+
+    work_dir = str(tmp_path / "batch")
+    assert decide_sharded(ports, "watchlist.json", "countries.json",
+                          work_dir, nodes=3, shard_size=150,
+                          reference_date=reference_date) == expected
+    manifest = read_manifest(work_dir)
+    assert [shard["count"] for shard in manifest["shards"]] == \
+        [150] * 6 + [100]
+    assert all(shard["status"] == "done" for shard in manifest["shards"])
+
+    #lose one shard's decisions, as if its node had crashed
+    decisions_files = sorted(name for name in os.listdir(work_dir)
+                             if name.endswith(".decisions.json"))
+    os.remove(os.path.join(work_dir, decisions_files[2]))
+    mtimes = dict((name, os.stat(os.path.join(work_dir, name)).st_mtime_ns)
+                  for name in decisions_files if name != decisions_files[2])
+    assert decide_sharded(ports, "watchlist.json", "countries.json",
+                          work_dir, nodes=3, shard_size=150) == expected
+    for name, mtime in mtimes.items():
+        assert os.stat(os.path.join(work_dir, name)).st_mtime_ns == mtime
+
+    with pytest.raises(ValueError):
+        decide_sharded(ports[:1], "watchlist.json", "countries.json",
+                       work_dir)
+
+
+def test_entry_formats(tmp_path):
+    """
+    Tests that entries converted to JSON lines and to the compact format are
+    decided and sharded as the JSON array is, and that appended JSON lines
+    are tailed.
+    """
+    with open("countries.json") as json_file:
+        countries = json.load(json_file)
+    with open("watchlist.json") as json_file:
+        watch_list = json.load(json_file)
+    reference_date = date(2014, 11, 1)
+    array_file = str(tmp_path / "entries.json")
+    write_entries(array_file, generate_entries(
+        500, countries, watch_list, seed=17, watchlist_rate=0.1,
+        reference_date=reference_date))
+    expected = decide(array_file, "watchlist.json", "countries.json",
+                      reference_date=reference_date)
+
+    for name in ["entries.jsonl", "entries.ndjson",
+                 "entries" + entry_store.SUFFIX, "round_trip.json"]:
+        source = array_file if name != "round_trip.json" \
+            else str(tmp_path / ("entries" + entry_store.SUFFIX))
+        assert entry_store.convert(source, str(tmp_path / name)) == 500
+        assert decide(str(tmp_path / name), "watchlist.json",
+                      "countries.json",
+                      reference_date=reference_date) == expected
+
+    #every format can be sharded
+    assert decide_sharded([str(tmp_path / "entries.ndjson"),
+                           str(tmp_path / ("entries" + entry_store.SUFFIX))],
+                          "watchlist.json", "countries.json",
+                          str(tmp_path / "batch"), nodes=1, shard_size=300,
+                          reference_date=reference_date) == expected * 2
+
+    feed_file = str(tmp_path / "feed.jsonl")
+    with open(feed_file, "w") as feed, open(feed_file) as tailed:
+        records = iter_jsonl(tailed, follow=True, poll_interval=0.01)
+        feed.write('{"first_name": "A"}\n{"first_name": ')
+        feed.flush()
+        assert next(records) == {"first_name": "A"}
+        feed.write('"B"}\n')
+        feed.flush()
+        assert next(records) == {"first_name": "B"}
+        records.close()
+
+    #decisions are made as the lines are appended
+    with open(array_file) as json_file:
+        entries = json.load(json_file)
+    feed_file = str(tmp_path / "decide_feed.jsonl")
+    with open(feed_file, "w") as feed:
+        decisions = decide_iter(feed_file, "watchlist.json", "countries.json",
+                                reference_date=reference_date, follow=True,
+                                poll_interval=0.01)
+        for entry, decision in zip(entries[:5], expected):
+            feed.write(json.dumps(entry) + "\n")
+            feed.flush()
+            assert next(decisions) == decision
+        decisions.close()
+    with pytest.raises(ValueError):
+        next(decide_iter(array_file, "watchlist.json", "countries.json",
+                         follow=True))
+
+
+def test_decision_cache():
+    """
+    Tests that repeated travellers are served from the cache with the same
+    decisions, that a changed watchlist invalidates it, and that entries
+    are evicted by size and expired by age.
+    """
+    with open("countries.json") as json_file:
+        countries = CountryTable(json.load(json_file))
+    watch_list = WatchlistIndex()
+    reference_date = date(2014, 11, 1)
+    entries = list(generate_entries(200, {"ALB": {}, "LUG": {}, "FRY": {}},
+                                    seed=18, reference_date=reference_date))
+    expected = list(decide_entries(entries, watch_list, countries,
+                                   reference_date=reference_date))
+
+    cache = DecisionCache(maxsize=1000)
+    for _ in range(3):
+        assert [cache.decide(entry, watch_list, countries, reference_date)
+                for entry in entries] == expected
+    assert cache.misses == 200 and cache.hits == 400
+    assert cache.hit_rate == 400 / 600
+
+    #a different city is not read by the rules, so it is still a hit
+    moved = json.loads(json.dumps(entries[0]))
+    moved["from"]["city"] = "Elsewhere"
+    cache.decide(moved, watch_list, countries, reference_date)
+    assert cache.hits == 401
+
+    traveller = [entry for entry, decision in zip(entries, expected)
+                 if decision == "Accept"][0]
+    watch_list.add({"first_name": "", "last_name": "",
+                    "passport": traveller["passport"]})
+    assert cache.decide(traveller, watch_list, countries,
+                        reference_date) == "Secondary"
+    assert cache.invalidations == 1 and len(cache) == 1
+
+    now = [0.0]
+    cache = DecisionCache(maxsize=50, ttl=10, clock=lambda: now[0])
+    for entry in entries[:100]:
+        cache.decide(entry, watch_list, countries, reference_date)
+    assert len(cache) == 50 and cache.evictions == 50
+    now[0] = 11.0
+    cache.decide(entries[99], watch_list, countries, reference_date)
+    assert cache.expirations == 1 and cache.hits == 0
+
+
+def test_rule_plan():
+    """
+    Tests that a rule plan decides like decide_entries in any check order,
+    including the order it picks from a profile, and on records the rules
+    can not decide.
+    """
+    with open("countries.json") as json_file:
+        countries = CountryTable(json.load(json_file))
+    with open("watchlist.json") as json_file:
+        watch_list = WatchlistIndex(json.load(json_file))
+    reference_date = date(2014, 11, 1)
+    entries = list(generate_entries(500, {"ALB": {}, "LUG": {}, "FRY": {},
+                                          "KRA": {}},
+                                    seed=19, reference_date=reference_date,
+                                    invalid_rate=0.3))
+
+    plan = RulePlan().optimize(entries[:200], countries, reference_date)
+    report = plan.report()
+    assert sorted(report["order"]) == sorted(RulePlan().order)
+    assert report["profile"]["records"] == 200
+    assert set(report["profile"]["checks"]["missing_visa"]) == {
+        "calls", "rejections", "seconds", "rejection_rate",
+        "us_per_rejection"}
+
+    for order in [None, plan.order, list(reversed(plan.order))]:
+        for later in [reference_date, date(2017, 1, 1)]:
+            assert list(RulePlan(order).decide_entries(
+                entries, watch_list, countries, later)) == list(
+                decide_entries(entries, watch_list, countries,
+                               reference_date=later))
+
+    odd = {"first_name": "A", "last_name": "B", "passport": "AAAAA-BBBBB-"
+           "CCCCC-DDDDD-EEEEE", "birth_date": "1980-01-01",
+           "entry_reason": "returning", "home": None,
+           "from": {"city": "X", "region": "Y", "country": "KAN"}}
+    with pytest.raises(AttributeError):
+        list(decide_entries([odd], watch_list, countries))
+    with pytest.raises(AttributeError):
+        list(plan.decide_entries([odd], watch_list, countries))
+    with pytest.raises(ValueError):
+        RulePlan(["missing_field"])
+
+
+def test_command_line(tmp_path, capsys):
+    """
+    Tests that "python -m papers decide" prints the decisions of each file,
+    that its snapshot is written once and rewritten when the reference data
+    changes, and that importing papers leaves multiprocessing unimported.
+    """
+    countries_file = str(tmp_path / "countries.json")
+    with open("countries.json") as json_file:
+        countries = json.load(json_file)
+    with open(countries_file, "w") as json_file:
+        json.dump(countries, json_file)
+    snapshot_file = str(tmp_path / "reference.snapshot")
+    arguments = ["decide", "example_entries.json", "test_quarantine.json",
+                 "--countries", countries_file, "--snapshot", snapshot_file,
+                 "--reference-date", "2014-11-01"]
+    expected = [decide(name, "watchlist.json", "countries.json",
+                       reference_date=date(2014, 11, 1))
+                for name in ["example_entries.json", "test_quarantine.json"]]
+
+    assert main(arguments) == 0
+    assert [json.loads(line) for line in
+            capsys.readouterr().out.splitlines()] == expected
+    written = os.stat(snapshot_file).st_mtime_ns
+    assert main(arguments) == 0
+    assert os.stat(snapshot_file).st_mtime_ns == written
+    capsys.readouterr()
+
+    countries["ALB"]["medical_advisory"] = "EBOLA"
+    with open(countries_file, "w") as json_file:
+        json.dump(countries, json_file)
+    stat = os.stat(countries_file)
+    os.utime(countries_file, ns=(stat.st_atime_ns,
+                                 stat.st_mtime_ns + 10 ** 9))
+    assert main(arguments) == 0
+    assert json.loads(capsys.readouterr().out.splitlines()[0]) != expected[0]
+
+    with pytest.raises(SystemExit):
+        main(["decide", str(tmp_path / "missing.json")])
+    imported = subprocess.check_output(
+        [sys.executable, "-c", "import papers, sys; "
+                               "print('multiprocessing' in sys.modules)"],
+        cwd=loader.DATA_DIR)
+    assert imported.strip() == b"False"
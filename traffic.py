@@ -0,0 +1,149 @@
+""" Seeded generator of synthetic entry records for Kanadia's border """
+
+__author__ = 'Amy Kwan, Jessica Mann, Susan Sim'
+__email__ = "amykwan.cma@gmail.com, jessmann74@gmail.com, ses@drsusansim.org"
+
+__copyright__ = "2014 AKJMSM"
+__license__ = "MIT License"
+
+__status__ = "v8"
+
+# imports one per line
+import datetime
+import json
+import random
+import string
+from datetime import date
+
+FIRST_NAMES = ["ELIZABETH", "VENITA", "TONY", "MARGERY", "PIEDAD", "VICKI",
+               "JOHN", "AMIR", "LING", "SANJAY", "FATIMA", "OLGA", "PEDRO",
+               "AIKO", "KWAME", "INGRID", "MATEO", "NADIA", "TOMASZ", "YUKI"]
+LAST_NAMES = ["WENDT", "CULP", "THRASH", "WITHROW", "KILGORE", "NOYES",
+              "SMITH", "NGUYEN", "OKAFOR", "ROSSI", "KOWALSKI", "TANAKA",
+              "SILVA", "HANSEN", "PATEL", "GARCIA", "MULLER", "DUBOIS",
+              "IVANOV", "CHEN"]
+PLACES = [("Bala", "ON"), ("Eureka", "NU"), ("Moncton", "NB"),
+          ("Urella", "Parsol"), ("Ratio", "Fraction"), ("Weasel", "Rodent"),
+          ("Desmond", "Ohio"), ("Platica", "Encerta")]
+PASSPORT_CHARACTERS = string.ascii_uppercase + string.digits
+
+
+def random_passport(rng):
+    """
+    makes a random passport number of five sets of five characters
+    :param rng: random.Random instance
+    :return: string
+    """
+
+    return "-".join("".join(rng.choice(PASSPORT_CHARACTERS) for _ in range(5))
+                    for _ in range(5))
+
+
+def generate_entries(count, countries, watch_list=(), seed=1340,
+                     reference_date=None, invalid_rate=0.05, visa_rate=0.4,
+                     via_rate=0.2, watchlist_rate=0.01):
+    """
+    makes a reproducible stream of entry records shaped like the test files
+    returning Kanadians come home from any country; visitors and travellers
+        in transit come from the countries in countries
+    :param count: number of entry records
+    :param countries: dictionary of country data keyed by country code, as
+        loaded from countries.json
+    :param watch_list: list of watchlist entries that watchlist hits copy
+        their name or passport from
+    :param seed: seed of the random number generator
+    :param reference_date: datetime.date the birth and visa dates are
+        generated around; defaults to today
+    :param invalid_rate: fraction of records with a missing or bad field
+    :param visa_rate: fraction of records that carry a visa
+    :param via_rate: fraction of records that travelled via another country
+    :param watchlist_rate: fraction of records matching the watchlist
+    :return: iterator of entry records
+    """
+
+    rng = random.Random(seed)
+    if reference_date is None:
+        reference_date = date.today()
+    codes = sorted(countries)
+    suspects = [suspect for suspect in watch_list
+                if suspect["passport"] != ""
+                or suspect["first_name"] != "" and suspect["last_name"] != ""]
+
+    for _ in range(count):
+        entry = _random_entry(rng, codes, reference_date)
+        if rng.random() < visa_rate:
+            entry["visa"] = {"date": _random_date(rng, reference_date, 3),
+                             "code": random_passport(rng)[:11]}
+        if rng.random() < via_rate:
+            entry["via"] = _random_location(rng, rng.choice(codes))
+        if suspects and rng.random() < watchlist_rate:
+            suspect = rng.choice(suspects)
+            if suspect["passport"] != "":
+                entry["passport"] = suspect["passport"]
+            else:
+                entry["first_name"] = suspect["first_name"]
+                entry["last_name"] = suspect["last_name"]
+        if rng.random() < invalid_rate:
+            _spoil(rng, entry, reference_date)
+        yield entry
+
+
+def write_entries(entries_file, entries):
+    """
+    writes entry records as one JSON array without holding them all
+    :param entries_file: path of the file to write
+    :param entries: iterable of entry records
+    :return: int number of records written
+    """
+
+    count = 0
+    with open(entries_file, "w") as json_file:
+        json_file.write("[")
+        for entry in entries:
+            if count:
+                json_file.write(",\n")
+            json.dump(entry, json_file)
+            count += 1
+        json_file.write("]\n")
+    return count
+
+
+def _random_entry(rng, codes, reference_date):
+    home = "KAN" if rng.random() < 0.4 else rng.choice(codes)
+    return {"passport": random_passport(rng),
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "birth_date": _random_date(rng, reference_date, 90),
+            "home": _random_location(rng, home),
+            "from": _random_location(rng, rng.choice(codes)),
+            "entry_reason": "returning" if home == "KAN"
+            else rng.choice(["visit", "transit"])}
+
+
+def _random_location(rng, country):
+    city, region = rng.choice(PLACES)
+    return {"city": city, "region": region, "country": country}
+
+
+def _random_date(rng, reference_date, years):
+    #a date up to the given number of years before the reference date
+    days = rng.randrange(1, years * 365)
+    return (reference_date - datetime.timedelta(days=days)).isoformat()
+
+
+def _spoil(rng, entry, reference_date):
+    #makes one of the ways a record can be invalid
+    fault = rng.randrange(5)
+    field = rng.choice(["passport", "first_name", "last_name", "birth_date",
+                        "home", "from", "entry_reason"])
+    if fault == 0:
+        del entry[field]
+    elif fault == 1:
+        entry[field] = ""
+    elif fault == 2:
+        entry["passport"] = random_passport(rng)[:23]
+    elif fault == 3:
+        entry["birth_date"] = (reference_date
+                               + datetime.timedelta(days=30)).isoformat()
+    else:
+        entry["birth_date"] = entry["birth_date"].replace("-", "/")